@@ -3,10 +3,12 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
+from src.panel_store import load_panel
+from Data_analysis.contractual_path import load_schedule
 
 def plot_upb_actual_vs_contractual(
-    merged_path: str,               
-    amort_schedule_path: str,      
+    merged_path,
+    amort_schedule_path,
     *,
     start_year: int = 2010,
     end_year: int = 2025,
@@ -15,8 +17,9 @@ def plot_upb_actual_vs_contractual(
 ) -> pd.DataFrame:
    
     # Load inputs 
-    merged = pd.read_csv(merged_path)
-    schedule = pd.read_parquet(amort_schedule_path)
+    merged = load_panel(merged_path, columns=["MonthlyReportingPeriod", "CurrentActualUPB"])
+    schedule = load_schedule(amort_schedule_path, columns=["ContractualDate", "ContractualUPB"],
+                             until=pd.Timestamp(year=end_year, month=12, day=1))
 
     # Actual UPB by year 
     merged = merged.copy()
@@ -1,11 +1,45 @@
+import os
+import time
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from src.panel_store import load_panel
+from src.format_variables_mortgages import month_index_to_datetime, datetime_to_month_index
 
 
-def build_amortization_schedule(input_path: str) -> pd.DataFrame:
-    merged = pd.read_csv(input_path)
-  
-    #loan-level parameters 
+SCHEDULE_COLS = ["LoanSequenceNumber", "MonthIndex", "ContractualUPB", "Schedueled Interest",
+                 "Schedueled Principal", "Monthly Installment", "ContractualDate"]
+
+SCHEDULE_SCHEMA = pa.schema([
+    ("LoanSequenceNumber", pa.string()),
+    ("MonthIndex", pa.int64()),
+    ("ContractualUPB", pa.float64()),
+    ("Schedueled Interest", pa.float64()),
+    ("Schedueled Principal", pa.float64()),
+    ("Monthly Installment", pa.float64()),
+    ("ContractualDate", pa.timestamp("ns")),
+])
+
+
+# Working bytes per schedule row while a chunk is built (arrays, DataFrame, Arrow copy)
+BYTES_PER_SCHEDULE_ROW = 256
+
+
+def _schedule_schema(ids: np.ndarray) -> pa.Schema:
+
+    # Integer loan IDs are written as integers, anything else as strings
+    if ids.dtype.kind in "iu":
+        return SCHEDULE_SCHEMA.set(0, pa.field("LoanSequenceNumber", pa.from_numpy_dtype(ids.dtype)))
+    return SCHEDULE_SCHEMA
+
+
+def loan_parameters(merged: pd.DataFrame) -> pd.DataFrame:
+
+    #loan-level parameters
     loan = (
         merged.sort_values(["LoanSequenceNumber", "MonthlyReportingPeriod"])
          .groupby("LoanSequenceNumber", as_index=False)
@@ -26,11 +60,364 @@ def build_amortization_schedule(input_path: str) -> pd.DataFrame:
     loan["n"] = ((loan["maturity"].dt.year - loan["start"].dt.year) * 12 +
                  (loan["maturity"].dt.month - loan["start"].dt.month)).astype(int)
 
-    #Compute the level payment
-    loan["A"] = loan["UPB"] * loan["r_m"] / (1.0 - (1.0 + loan["r_m"]) ** (-loan["n"]))
+    #Compute the level payment (straight-line when the rate is zero)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = loan["UPB"] * loan["r_m"] / (1.0 - (1.0 + loan["r_m"]) ** (-loan["n"]))
+    loan["A"] = np.where(loan["r_m"] == 0, loan["UPB"] / loan["n"].where(loan["n"] > 0), annuity)
+
+    # start as integer month (year * 12 + month - 1)
+    loan["start_month"] = loan["start"].dt.year * 12 + loan["start"].dt.month - 1
+
+    return loan
+
+
+def balance_after(P0, r, A, k):
+
+    # Closed-form balance after k level payments: P0 (1+r)^k - A ((1+r)^k - 1) / r
+    P0, r, A, k = (np.asarray(x, dtype="float64") for x in (P0, r, A, k))
+    growth = np.power(1.0 + r, k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity_factor = np.where(r == 0, k, (growth - 1.0) / r)
+    return P0 * growth - A * annuity_factor
+
+
+def schedule_arrays(P0, r, n, A, start_month) -> dict:
+
+    # All loans x months 1..n at once; rows grouped by loan, months ascending
+    n = np.clip(np.asarray(n, dtype=np.int64), 0, None)
+    loan_pos = np.repeat(np.arange(len(n)), n)
+    offsets = np.concatenate(([0], np.cumsum(n)[:-1]))
+    k = np.arange(loan_pos.size, dtype=np.int64) - np.repeat(offsets, n) + 1
+
+    P0_k, r_k, A_k = (np.asarray(x, dtype="float64")[loan_pos] for x in (P0, r, A))
+    upb_prev = balance_after(P0_k, r_k, A_k, k - 1)
+    interest = upb_prev * r_k
+    principal = A_k - interest
+
+    return {
+        "loan_pos": loan_pos,
+        "MonthIndex": k,
+        "ContractualUPB": upb_prev - principal,
+        "Schedueled Interest": interest,
+        "Schedueled Principal": principal,
+        "Monthly Installment": A_k,
+        "ContractualDate": month_index_to_datetime(np.asarray(start_month)[loan_pos] + k),
+    }
+
+
+def schedule_frame(loan: pd.DataFrame) -> pd.DataFrame:
+
+    arrays = schedule_arrays(loan["UPB"].to_numpy(), loan["r_m"].to_numpy(), loan["n"].to_numpy(),
+                             loan["A"].to_numpy(), loan["start_month"].to_numpy())
+    loan_pos = arrays.pop("loan_pos")
+    arrays["LoanSequenceNumber"] = loan["LoanSequenceNumber"].to_numpy()[loan_pos]
+
+    return pd.DataFrame(arrays, columns=SCHEDULE_COLS)
+
+
+def build_amortization_schedule(input_path) -> pd.DataFrame:
+    merged = load_panel(input_path, columns=["LoanSequenceNumber", "MonthlyReportingPeriod",
+                                             "CurrentInterestRate", "MaturityDate", "UPB"])
+
+    return schedule_frame(loan_parameters(merged))
+
+
+def _to_month_index(periods) -> np.ndarray:
+
+    # Dates or integer month indexes (year * 12 + month - 1)
+    periods = np.asarray(periods)
+    if np.issubdtype(periods.dtype, np.number):
+        return periods.astype("float64")
+    return datetime_to_month_index(periods)
+
+
+class ContractualSchedule:
+
+    # Lazy contractual schedule: only the per-loan parameters (P0, r_m, n, A, start) are stored,
+    # balance/interest/principal are evaluated in closed form for the requested (loan, period) pairs.
+
+    PARAM_COLS = ["LoanSequenceNumber", "UPB", "r_m", "n", "A", "start_month"]
+
+    def __init__(self, loan: pd.DataFrame):
+        self.loans = loan[self.PARAM_COLS].reset_index(drop=True)
+        self._index = pd.Index(self.loans["LoanSequenceNumber"])
+
+    @classmethod
+    def from_panel(cls, source) -> "ContractualSchedule":
+        merged = load_panel(source, columns=["LoanSequenceNumber", "MonthlyReportingPeriod",
+                                             "CurrentInterestRate", "MaturityDate", "UPB"])
+        return cls(loan_parameters(merged))
+
+    @classmethod
+    def read_parquet(cls, path) -> "ContractualSchedule":
+        return cls(pd.read_parquet(path))
+
+    def to_parquet(self, path) -> None:
+        self.loans.to_parquet(path, index=False)
+
+    def __len__(self) -> int:
+        return len(self.loans)
+
+    def __repr__(self) -> str:
+        return f"ContractualSchedule(loans={len(self)}, rows_if_materialized={int(self.loans['n'].clip(lower=0).sum())})"
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.loans.memory_usage(deep=True, index=False).sum())
+
+    def installments(self) -> pd.Series:
+        return pd.Series(self.loans["A"].to_numpy(), index=self._index, name="Monthly Installment")
+
+    def evaluate(self, loan_ids, periods) -> pd.DataFrame:
+
+        # Aligned with the inputs; NaN where the loan is unknown or the period is outside months 1..n
+        pos = self._index.get_indexer(pd.Index(loan_ids))
+        known = pos >= 0
+        loans = self.loans
+        P0, r, n, A, start = (loans[c].to_numpy(dtype="float64")[pos] for c in ["UPB", "r_m", "n", "A", "start_month"])
+
+        k = _to_month_index(periods) - start
+        valid = known & (k >= 1) & (k <= n)
+
+        upb_prev = balance_after(P0, r, A, k - 1)
+        interest = upb_prev * r
+        principal = A - interest
+
+        out = pd.DataFrame({
+            "MonthIndex": k,
+            "ContractualUPB": upb_prev - principal,
+            "Schedueled Interest": interest,
+            "Schedueled Principal": principal,
+            "Monthly Installment": np.where(known, A, np.nan),
+        })
+        out.loc[~valid, ["MonthIndex", "ContractualUPB", "Schedueled Interest", "Schedueled Principal"]] = np.nan
+        return out
+
+    def evaluate_frame(self, loan_ids, periods) -> pd.DataFrame:
+
+        # Schedule rows (same columns as build_amortization_schedule) for the given pairs only
+        values = self.evaluate(loan_ids, periods)
+        keep = values["MonthIndex"].notna().to_numpy()
+        frame = values[keep].reset_index(drop=True)
+        frame["MonthIndex"] = frame["MonthIndex"].astype(np.int64)
+        frame.insert(0, "LoanSequenceNumber", np.asarray(loan_ids)[keep])
+        frame["ContractualDate"] = month_index_to_datetime(_to_month_index(periods)[keep])
+        return frame[SCHEDULE_COLS]
+
+    def to_frame(self, until=None) -> pd.DataFrame:
 
+        # Materialized schedule, optionally truncated at a period (inclusive)
+        loan = self.loans
+        if until is not None:
+            last = datetime_to_month_index([until])[0]
+            loan = loan.assign(n=np.minimum(loan["n"], last - loan["start_month"]).astype(np.int64))
+        return schedule_frame(loan)
 
-    #Build amortization path
+
+def load_schedule(source, columns=None, until=None) -> pd.DataFrame:
+
+    # ContractualSchedule -> materialized up to `until`; anything else goes through load_panel
+    if isinstance(source, ContractualSchedule):
+        frame = source.to_frame(until=until)
+        return frame if columns is None else frame[list(columns)]
+    return load_panel(source, columns=columns)
+
+
+def iter_schedule(source, columns=None, *, until=None, batch_rows: int = 1_000_000):
+
+    # Schedule in batches of about batch_rows rows: evaluated loan chunk by loan chunk for a
+    # ContractualSchedule (truncated at `until`), Parquet record batches for a schedule file.
+    # Other sources are loaded once and sliced.
+    if isinstance(source, ContractualSchedule):
+        loan = source.loans
+        if until is not None:
+            last = datetime_to_month_index([until])[0]
+            loan = loan.assign(n=np.minimum(loan["n"], last - loan["start_month"]).astype(np.int64))
+        for start, stop in _chunk_bounds(loan["n"].to_numpy(), batch_rows):
+            frame = schedule_frame(loan.iloc[start:stop])
+            yield frame if columns is None else frame[list(columns)]
+        return
+
+    if not isinstance(source, pd.DataFrame):
+        path = Path(source)
+        if path.suffix == ".parquet" and path.is_file():
+            parquet = pq.ParquetFile(path)
+            for batch in parquet.iter_batches(batch_size=batch_rows, columns=None if columns is None else list(columns)):
+                yield batch.to_pandas()
+            return
+
+    frame = load_schedule(source, columns=columns)
+    for start in range(0, len(frame), batch_rows):
+        yield frame.iloc[start:start + batch_rows]
+
+
+def _chunk_bounds(n, max_rows: int) -> list[tuple[int, int]]:
+
+    # Consecutive loan ranges whose schedules hold at most max_rows rows (a single longer loan gets its own chunk)
+    rows = np.cumsum(np.clip(np.asarray(n, dtype=np.int64), 0, None))
+    bounds, start, done = [], 0, 0
+    while start < len(rows):
+        stop = int(np.searchsorted(rows, done + max_rows, side="right"))
+        stop = max(stop, start + 1)
+        bounds.append((start, stop))
+        done = int(rows[stop - 1])
+        start = stop
+    return bounds
+
+
+def write_amortization_schedule(
+    source,
+    output_path,
+    *,
+    memory_limit_mb: float = 512,
+    compression: str = "snappy",
+) -> dict:
+
+    # Streaming version of build_amortization_schedule: loans in chunks, one Parquet row group per chunk
+    schedule = source if isinstance(source, ContractualSchedule) else ContractualSchedule.from_panel(source)
+    loan = schedule.loans.sort_values("LoanSequenceNumber", kind="stable").reset_index(drop=True)
+
+    max_rows = max(int(memory_limit_mb * 1e6 / BYTES_PER_SCHEDULE_ROW), 1)
+    bounds = _chunk_bounds(loan["n"].to_numpy(), max_rows)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    n_rows = 0
+    largest = 0
+    schema = _schedule_schema(loan["LoanSequenceNumber"].to_numpy())
+    with pq.ParquetWriter(output_path, schema, compression=compression) as writer:
+        for start, stop in bounds:
+            chunk = schedule_frame(loan.iloc[start:stop])
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            n_rows += len(chunk)
+            largest = max(largest, len(chunk))
+
+    return {
+        "path": str(output_path),
+        "loans": len(loan),
+        "rows": n_rows,
+        "row_groups": len(bounds),
+        "max_rows_per_row_group": largest,
+        "memory_limit_mb": memory_limit_mb,
+    }
+
+
+# Numeric per-loan parameters shared with the workers, one row each in a float64 block
+_SHARED_PARAMS = ["UPB", "r_m", "n", "A", "start_month"]
+
+
+def _schedule_shard(params_name, ids_name, ids_dtype, n_loans, start, stop, path, max_rows, schema) -> dict:
+
+    t0 = time.perf_counter()
+    params_shm = SharedMemory(name=params_name)
+    ids_shm = SharedMemory(name=ids_name)
+    try:
+        # Copy this shard's slice out of shared memory, then release the views
+        params = np.ndarray((len(_SHARED_PARAMS), n_loans), dtype=np.float64, buffer=params_shm.buf)
+        ids = np.ndarray((n_loans,), dtype=ids_dtype, buffer=ids_shm.buf)
+        loan = pd.DataFrame({name: params[i, start:stop].copy() for i, name in enumerate(_SHARED_PARAMS)})
+        loan["LoanSequenceNumber"] = (ids[start:stop].copy() if ids.dtype.kind in "iu"
+                                      else ids[start:stop].astype(str).astype(object))
+        del params, ids
+    finally:
+        params_shm.close()
+        ids_shm.close()
+
+    loan["n"] = loan["n"].astype(np.int64)
+    loan["start_month"] = loan["start_month"].astype(np.int64)
+
+    n_rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for a, b in _chunk_bounds(loan["n"].to_numpy(), max_rows):
+            chunk = schedule_frame(loan.iloc[a:b])
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            n_rows += len(chunk)
+
+    seconds = time.perf_counter() - t0
+    return {
+        "shard": Path(path).name,
+        "pid": os.getpid(),
+        "loans": stop - start,
+        "rows": n_rows,
+        "seconds": seconds,
+        "rows_per_second": n_rows / seconds if seconds > 0 else np.nan,
+    }
+
+
+def build_amortization_schedule_parallel(
+    source,
+    output_dir,
+    *,
+    max_workers: int | None = None,
+    shards_per_worker: int = 4,
+    memory_limit_mb: float = 256,
+) -> pd.DataFrame:
+
+    # Loans are split into contiguous, row-balanced shards; each worker writes its own Parquet file,
+    # so the directory reads back as one dataset ordered by (loan, date). The report has one row
+    # per shard; the wall-clock time of the whole run is in report.attrs["wall_seconds"].
+    t0 = time.perf_counter()
+    schedule = source if isinstance(source, ContractualSchedule) else ContractualSchedule.from_panel(source)
+    loan = schedule.loans.sort_values("LoanSequenceNumber", kind="stable").reset_index(drop=True)
+    n_loans = len(loan)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for old in output_dir.glob("shard-*.parquet"):
+        old.unlink()
+
+    max_workers = max_workers or os.cpu_count() or 1
+    total_rows = int(loan["n"].clip(lower=0).sum())
+    n_shards = max(1, min(n_loans, max_workers * shards_per_worker))
+    shards = _chunk_bounds(loan["n"].to_numpy(), max(-(-total_rows // n_shards), 1))
+    max_rows = max(int(memory_limit_mb * 1e6 / BYTES_PER_SCHEDULE_ROW), 1)
+
+    # Per-loan inputs go through shared memory instead of pickled DataFrames
+    params = loan[_SHARED_PARAMS].to_numpy(dtype=np.float64).T
+    ids = loan["LoanSequenceNumber"].to_numpy()
+    schema = _schedule_schema(ids)
+    if ids.dtype.kind not in "iu":
+        ids = ids.astype(str).astype(np.bytes_)
+    params_shm = SharedMemory(create=True, size=max(params.nbytes, 1))
+    ids_shm = SharedMemory(create=True, size=max(ids.nbytes, 1))
+    try:
+        np.ndarray(params.shape, dtype=np.float64, buffer=params_shm.buf)[:] = params
+        np.ndarray(ids.shape, dtype=ids.dtype, buffer=ids_shm.buf)[:] = ids
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_schedule_shard, params_shm.name, ids_shm.name, ids.dtype.str, n_loans,
+                            start, stop, output_dir / f"shard-{i:05d}.parquet", max_rows, schema)
+                for i, (start, stop) in enumerate(shards)
+            ]
+            report = pd.DataFrame([f.result() for f in futures])
+    finally:
+        params_shm.close()
+        params_shm.unlink()
+        ids_shm.close()
+        ids_shm.unlink()
+
+    report.attrs["wall_seconds"] = time.perf_counter() - t0
+    return report
+
+
+def summarize_parallel_run(report: pd.DataFrame) -> pd.DataFrame:
+
+    # Throughput per worker process, plus an overall row from the run's own wall-clock time
+    wall_seconds = report.attrs.get("wall_seconds")
+    per_worker = (report.groupby("pid", as_index=False)
+                        .agg(shards=("shard", "count"), rows=("rows", "sum"), seconds=("seconds", "sum")))
+    per_worker["rows_per_second"] = per_worker["rows"] / per_worker["seconds"]
+    if wall_seconds:
+        per_worker.loc[len(per_worker)] = ["all", per_worker["shards"].sum(), per_worker["rows"].sum(),
+                                           wall_seconds, per_worker["rows"].sum() / wall_seconds]
+    return per_worker
+
+
+def _build_schedule_loop(loan: pd.DataFrame) -> pd.DataFrame:
+
+    # Reference implementation (one Python iteration per loan-month), kept for the equivalence check
     records = []
     for _, row in loan.iterrows():
         lid = row["LoanSequenceNumber"]
@@ -55,7 +442,59 @@ def build_amortization_schedule(input_path: str) -> pd.DataFrame:
 
             upb_prev = upb_k
 
-    schedule = pd.DataFrame(records)
+    schedule = pd.DataFrame(records, columns=SCHEDULE_COLS)
     schedule["ContractualDate"] = pd.to_datetime(schedule["ContractualDate"]).dt.to_period("M").dt.to_timestamp()
 
     return schedule
+
+
+def benchmark_amortization(
+    input_path,
+    *,
+    max_loans: int | None = 2_000,
+    atol: float = 1e-6,
+    output_dir: str = "Outputs/reports/benchmarks",
+    filename: str = "amortization_benchmark.csv",
+) -> pd.DataFrame:
+
+    merged = load_panel(input_path, columns=["LoanSequenceNumber", "MonthlyReportingPeriod",
+                                             "CurrentInterestRate", "MaturityDate", "UPB"])
+    loan = loan_parameters(merged)
+    if max_loans is not None:
+        loan = loan.head(max_loans)
+
+    t0 = time.perf_counter()
+    loop = _build_schedule_loop(loan)
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vec = schedule_frame(loan)
+    t_vec = time.perf_counter() - t0
+
+    # Equivalence: same keys and dates, values within atol (the loop accumulates rounding month by month)
+    if len(loop) != len(vec):
+        raise AssertionError(f"Row count differs: loop {len(loop)} vs vectorized {len(vec)}.")
+    for col in ["LoanSequenceNumber", "MonthIndex", "ContractualDate"]:
+        if not (loop[col].to_numpy() == vec[col].to_numpy()).all():
+            raise AssertionError(f"Column '{col}' differs between loop and vectorized schedule.")
+
+    value_cols = ["ContractualUPB", "Schedueled Interest", "Schedueled Principal", "Monthly Installment"]
+    diffs = {c: float(np.max(np.abs(loop[c].to_numpy() - vec[c].to_numpy()), initial=0.0)) for c in value_cols}
+    worst = max(diffs.values(), default=0.0)
+    if worst > atol:
+        raise AssertionError(f"Vectorized schedule differs from the loop by up to {worst:.3g} (atol={atol}).")
+
+    report = pd.DataFrame([
+        {"engine": "loop", "loans": len(loan), "rows": len(loop), "seconds": t_loop},
+        {"engine": "vectorized", "loans": len(loan), "rows": len(vec), "seconds": t_vec},
+    ])
+    report["rows_per_second"] = report["rows"] / report["seconds"]
+    report["speedup_vs_loop"] = t_loop / report["seconds"]
+    report["max_abs_diff"] = worst
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
+    return report
@@ -2,67 +2,109 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import matplotlib.pyplot as plt
+from src.panel_store import load_panel
+from src.loan_panel import LoanPanel, loan_month_key
+from src.format_variables_mortgages import datetime_to_month_index, month_index_to_datetime
+from Data_analysis.contractual_path import iter_schedule
+
+
+def annual_interest_loss(portfolio: pd.DataFrame) -> pd.DataFrame:
+
+    # Year totals from the per-period totals
+    annual = (portfolio.assign(Year=pd.to_datetime(portfolio["Period"]).dt.year)
+                       .groupby("Year", as_index=False)["Interest_Loss"]
+                       .sum()
+                       .rename(columns={"Interest_Loss": "Interest_Loss_Year"}))
+    annual["Cum_Int_Loss_Year"] = annual["Interest_Loss_Year"].cumsum()
+    return annual
+
 
 def interest_loss_from_schedule(
-    merged_path: str,
-    amort_schedule_path: str,
+    merged_path,
+    amort_schedule_path,
     *,
     plot: bool = True,
+    detail: bool = False,
+    batch_rows: int = 1_000_000,
+    output_dir: str = "Outputs/reports/data_analysis",
+    filename: str = "annual_interest_loss.csv",
     fig_dir: str = "Outputs/Figures/data_analysis",
     fig_filename: str = "cumulative_interest_loss.png",
 ):
-    # Load & normalize dates
-    merged = pd.read_csv(merged_path).copy()
-    sched  = pd.read_parquet(amort_schedule_path).copy()
-    merged["MonthlyReportingPeriod"] = pd.to_datetime(merged["MonthlyReportingPeriod"]).dt.to_period("M").dt.to_timestamp()
-    sched["ContractualDate"]         = pd.to_datetime(sched["ContractualDate"]).dt.to_period("M").dt.to_timestamp()
-
-    last_actual = merged["MonthlyReportingPeriod"].max()
-    
-
-    # Fixed monthly rate per loan 
-    base = (merged.sort_values(["LoanSequenceNumber","MonthlyReportingPeriod"])
-                  .groupby("LoanSequenceNumber", as_index=False)
-                  .agg(r_annual=("CurrentInterestRate","first")))
-    base["r_m"] = (base["r_annual"].astype(float) / 100.0) / 12.0
+    # Scheduled minus actual interest per scheduled loan-month, summed straight into period
+    # totals while the schedule is streamed in batches; the year totals (Year,
+    # Interest_Loss_Year, Cum_Int_Loss_Year) are written to output_dir/filename.
+    # Returns (detail, portfolio, fig_path). The loan-month `detail` frame (loans x full term)
+    # is only built when detail=True; otherwise None is returned in its place.
+    merged = load_panel(merged_path, columns=["LoanSequenceNumber", "MonthlyReportingPeriod",
+                                              "CurrentInterestRate", "CurrentActualUPB"])
 
+    # Sorted by (loan, month) once: actual keys, previous UPB and the fixed monthly rate per loan
+    lp = LoanPanel(merged)
+    last_month = np.nanmax(lp.months) if len(lp) else np.nan
+    upb_prev = lp.shift(lp.column("CurrentActualUPB", dtype="float64"))
+    r_m = (lp.first(lp.column("CurrentInterestRate", dtype="float64"), skipna=True) / 100.0) / 12.0
+    r_m = np.append(r_m, np.nan)                                # unknown loans -> NaN rate
 
-    # Build the full schedule panel (baseline)
-    panel = (sched[["LoanSequenceNumber","ContractualDate","Schedueled Interest"]]
-                  .rename(columns={"ContractualDate":"Period"})
-                  .merge(base[["LoanSequenceNumber","r_m"]], on="LoanSequenceNumber", how="left"))
-    
+    until = None if np.isnan(last_month) else month_index_to_datetime([last_month])[0]
+    sums, frames, offset = [], [], 0
+    for batch in iter_schedule(amort_schedule_path, columns=["LoanSequenceNumber", "ContractualDate",
+                                                             "Schedueled Interest"],
+                               until=until, batch_rows=batch_rows):
+        months = datetime_to_month_index(batch["ContractualDate"])
+        keep = months <= last_month
+        rows = np.flatnonzero(keep) + offset
+        offset += len(batch)
+        if not keep.any():
+            continue
 
-    # previous month's actual UPB 
-    merged = merged.sort_values(["LoanSequenceNumber","MonthlyReportingPeriod"])
-    merged["Act_UPB_prev"] = merged.groupby("LoanSequenceNumber")["CurrentActualUPB"].shift(1)
-    act_period = merged[["LoanSequenceNumber","MonthlyReportingPeriod","Act_UPB_prev"]] \
-                      .rename(columns={"MonthlyReportingPeriod":"Period"})
+        months = months[keep]
+        codes = lp.ids.get_indexer(batch["LoanSequenceNumber"].to_numpy()[keep])
+        codes = np.where(codes < 0, lp.n_loans, codes)
 
+        # Previous actual UPB of the same (loan, month), 0 when there is no actual row (after payoff)
+        key = loan_month_key(codes, months)
+        pos = np.minimum(np.searchsorted(lp.key, key), max(len(lp) - 1, 0))
+        found = (codes < lp.n_loans) & (lp.key[pos] == key) if len(lp) else np.zeros(len(key), bool)
+        act_prev = np.nan_to_num(np.where(found, upb_prev[pos] if len(lp) else np.nan, np.nan), nan=0.0)
 
-    # after full prepay, Act_UPB_prev stays NaN -> set to 0
-    detail = (panel.merge(act_period, on=["LoanSequenceNumber","Period"], how="left"))
-    detail["Act_UPB_prev"] = detail["Act_UPB_prev"].fillna(0.0)
+        sched_interest = batch["Schedueled Interest"].to_numpy(dtype="float64")[keep]
+        interest_actual = r_m[codes] * act_prev
+        loss = sched_interest - interest_actual
 
-    detail = detail[ detail["Period"] <= last_actual ]
+        # Per-period partial sums of this batch (NaN losses are skipped, as in groupby.sum)
+        periods, inverse = np.unique(months, return_inverse=True)
+        sums.append(pd.DataFrame({"Period": periods,
+                                  "Interest_Loss": np.bincount(inverse, weights=np.nan_to_num(loss))}))
 
-    # Interest loss
-    detail["Interest_Actual"]    = detail["r_m"] * detail["Act_UPB_prev"]
-    detail["Interest_Scheduled"] = detail["Schedueled Interest"]
-    detail["Interest_Loss"]      = detail["Interest_Scheduled"] - detail["Interest_Actual"]
+        if detail:
+            period = month_index_to_datetime(months)
+            frames.append(pd.DataFrame({
+                "LoanSequenceNumber": batch["LoanSequenceNumber"].to_numpy()[keep],
+                "Period": period,
+                "Schedueled Interest": sched_interest,
+                "r_m": r_m[codes],
+                "Act_UPB_prev": act_prev,
+                "Interest_Actual": interest_actual,
+                "Interest_Scheduled": sched_interest,
+                "Interest_Loss": loss,
+                "Year": pd.DatetimeIndex(period).year,
+            }, index=rows))
 
     # cumulative
-    portfolio = (detail.groupby("Period", as_index=False)["Interest_Loss"]
-                       .sum()
-                       .sort_values("Period"))
+    portfolio = (pd.concat(sums, ignore_index=True) if sums
+                 else pd.DataFrame({"Period": np.array([], dtype="float64"), "Interest_Loss": np.array([], dtype="float64")}))
+    portfolio = (portfolio.groupby("Period", as_index=False)["Interest_Loss"]
+                          .sum()
+                          .sort_values("Period"))
+    portfolio["Period"] = month_index_to_datetime(portfolio["Period"])
     portfolio["Cum_Int_Loss"] = portfolio["Interest_Loss"].cumsum()
 
+    detail = (pd.concat(frames) if frames else None) if detail else None
 
-    detail["Year"] = pd.to_datetime(detail["Period"]).dt.year
-    annual = (detail.groupby("Year", as_index=False)["Interest_Loss"]
-                    .sum()
-                    .rename(columns={"Interest_Loss":"Interest_Loss_Year"}))
-    annual["Cum_Int_Loss_Year"] = annual["Interest_Loss_Year"].cumsum()
+    # Year totals
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    annual_interest_loss(portfolio).to_csv(Path(output_dir) / filename, index=False)
 
     # Plot 
     fig_path = None
@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from src.panel_store import load_panel, PanelStore, MANIFEST
+from src.format_variables_mortgages import datetime_to_month_index, month_index_to_datetime, loan_id_vintage
+
+
+# Columns written by add_prepayment_flags that the rates are built from
+FLAG_COLS = ["UPB_prev", "ScheduledPrincipalCurrent", "PartialPrepayAmt", "PrepayType"]
+
+# Cohort keys derived on the fly when the panel does not carry them
+DERIVED_KEYS = {"vintage": "LoanSequenceNumber", "rate_bucket": "CurrentInterestRate"}
+
+
+def add_cohort_keys(panel: pd.DataFrame, keys=("vintage", "rate_bucket"), *, rate_step: float = 0.5) -> pd.DataFrame:
+
+    panel = panel.copy(deep=False)
+
+    # Vintage = origination year in the loan ID, for panels without the lake's vintage partition
+    if "vintage" in keys:
+        panel["vintage"] = pd.array(loan_id_vintage(panel["LoanSequenceNumber"]), dtype="Int16")
+
+    # Rate bucket = lower edge of the rate_step-wide interval holding the current rate
+    if "rate_bucket" in keys:
+        rate = panel["CurrentInterestRate"].to_numpy(dtype="float64")
+        panel["rate_bucket"] = np.floor(rate / rate_step) * rate_step
+
+    return panel
+
+
+def _read_inputs(source, wanted: list[str]) -> pd.DataFrame:
+
+    # Column projection where the source allows it (frame or panel store)
+    if isinstance(source, pd.DataFrame):
+        available = source.columns
+    elif isinstance(source, PanelStore) or (Path(source) / MANIFEST).exists():
+        source = source if isinstance(source, PanelStore) else PanelStore(source)
+        available = source.columns
+    else:
+        return load_panel(source)
+    return load_panel(source, columns=[c for c in dict.fromkeys(wanted) if c in available])
+
+
+def prepayment_rates(
+    flagged,
+    by=("vintage",),
+    *,
+    sched=None,
+    rate_step: float = 0.5,
+    output_dir: str = "Outputs/reports/data_analysis",
+    filename: str = "prepayment_rates.csv",
+) -> pd.DataFrame:
+
+    # Monthly SMM / CPR and curtailment rates per cohort-month.
+    # flagged: output of add_prepayment_flags (frame, panel store or file); when it only
+    # holds PrepayType, pass `sched` and the flags are recomputed.
+    by = [by] if isinstance(by, str) else list(by)
+    derived = [k for k in by if k in DERIVED_KEYS]
+
+    wanted = ["LoanSequenceNumber", "MonthlyReportingPeriod", "CurrentActualUPB", "ZeroBalanceCode",
+              *FLAG_COLS, *by, *(DERIVED_KEYS[k] for k in derived)]
+    panel = _read_inputs(flagged, wanted)
+
+    if any(c not in panel.columns for c in FLAG_COLS):
+        if sched is None:
+            raise ValueError(f"Panel lacks {FLAG_COLS}; pass `sched` to recompute the prepayment flags.")
+        from Define_y import add_prepayment_flags
+        panel = add_prepayment_flags(panel.drop(columns=FLAG_COLS, errors="ignore"), sched)
+
+    derived = [k for k in derived if k not in panel.columns]
+    if derived:
+        panel = add_cohort_keys(panel, derived, rate_step=rate_step)
+
+    # Per-row amounts: balance exposed to prepayment after the scheduled principal
+    upb_prev = panel["UPB_prev"].to_numpy(dtype="float64")
+    principal = np.nan_to_num(panel["ScheduledPrincipalCurrent"].to_numpy(dtype="float64"))
+    active = ~np.isnan(upb_prev)
+    base = np.where(active, np.maximum(upb_prev - principal, 0.0), 0.0)
+
+    prepay_type = panel["PrepayType"].to_numpy()
+    full = active & (prepay_type == 1)
+    partial = active & (prepay_type == 2)
+    full_amt = np.where(full, base, 0.0)
+    curtail_amt = np.where(partial, panel["PartialPrepayAmt"].to_numpy(dtype="float64"), 0.0)
+
+    # One composite group code per (cohort keys, month); groups are the distinct codes only,
+    # so the output size follows the cohort-months present, not the product of key cardinalities
+    months = datetime_to_month_index(panel["MonthlyReportingPeriod"])
+    keep = active & ~np.isnan(months)
+    key_codes, key_uniques = [], []
+    for k in by:
+        codes, uniques = pd.factorize(panel[k], sort=True, use_na_sentinel=False)
+        key_codes.append(codes[keep])
+        key_uniques.append(uniques)
+
+    m = months[keep].astype(np.int64)
+    m0 = int(m.min()) if m.size else 0
+    dims = tuple(len(u) for u in key_uniques) + (int(m.max()) - m0 + 1 if m.size else 1,)
+    composite = np.ravel_multi_index((*key_codes, m - m0), dims)
+    group, group_codes = pd.factorize(composite, sort=True)
+
+    n_groups = len(group_codes)
+
+    def _sum(values):
+        return np.bincount(group, weights=values[keep], minlength=n_groups)
+
+    out = {}
+    parts = np.unravel_index(group_codes, dims)
+    for k, uniques, codes in zip(by, key_uniques, parts):
+        out[k] = pd.Index(uniques).take(codes)
+    out["MonthlyReportingPeriod"] = month_index_to_datetime(parts[-1] + m0)
+
+    rates = pd.DataFrame(out)
+    rates["n_loans"] = np.bincount(group, minlength=n_groups)
+    rates["n_full_prepay"] = np.bincount(group, weights=full[keep], minlength=n_groups).astype(np.int64)
+    rates["n_partial_prepay"] = np.bincount(group, weights=partial[keep], minlength=n_groups).astype(np.int64)
+    rates["beginning_upb"] = _sum(upb_prev)
+    rates["scheduled_principal"] = _sum(principal)
+    rates["full_prepay_amt"] = _sum(full_amt)
+    rates["curtailment_amt"] = _sum(curtail_amt)
+
+    # SMM = prepaid principal / (beginning balance - scheduled principal); CPR = 1 - (1 - SMM)^12
+    exposed = _sum(base)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smm = np.where(exposed > 0, (rates["full_prepay_amt"] + rates["curtailment_amt"]) / exposed, np.nan)
+        curtail_smm = np.where(exposed > 0, rates["curtailment_amt"] / exposed, np.nan)
+    rates["SMM"] = smm
+    rates["CPR"] = 1 - (1 - smm) ** 12
+    rates["curtailment_SMM"] = curtail_smm
+    rates["curtailment_CPR"] = 1 - (1 - curtail_smm) ** 12
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    rates.to_csv(output_path / filename, index=False)
+
+    return rates
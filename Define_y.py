@@ -1,71 +1,261 @@
 import pandas as pd
 import numpy as np
+from pathlib import Path
+from src.panel_store import load_panel, PanelStore
+from src.loan_panel import LoanPanel, loan_month_key, sort_order
+from src.format_variables_mortgages import datetime_to_month_index, month_index_to_datetime
+from Data_analysis.contractual_path import ContractualSchedule
 
-def add_prepayment_flags(merged: pd.DataFrame, sched: pd.DataFrame) -> pd.DataFrame:
-    
-    merged = merged.copy()
-    sched = sched.copy()
 
+# build thresholds use to decide what is a significant prepayment - subjective choice
+# Absolute epsilon per loan: 15% of that installment
+ABS_EPS_FRACTION = 0.15
 
-    merged["MonthlyReportingPeriod"] = pd.to_datetime(merged["MonthlyReportingPeriod"]).dt.to_period("M").dt.to_timestamp()
+#minimum in dollars - since for a very small loans such as of 10K UPB the abs_eps will be also very small
+MIN_EPS = 200.0
 
-    sched["ContractualDate"] = pd.to_datetime(sched["ContractualDate"]).dt.to_period("M").dt.to_timestamp()
 
+def _scheduled_values(sched, loan_ids, uniques, codes, months, key):
 
-    # Align scheduled principal
-    sched = sched.rename(columns={"ContractualDate": "MonthlyReportingPeriod",
-                                  "Schedueled Principal": "ScheduledPrincipalCurrent"})
+    # Scheduled principal per panel row and installment per loan code, both as positional gathers
+    if isinstance(sched, ContractualSchedule):
+        values = sched.evaluate(loan_ids, months)
+        installment_by_code = sched.installments().reindex(uniques).to_numpy(dtype="float64")
+        return values["Schedueled Principal"].to_numpy(), installment_by_code
 
+    sched = load_panel(sched, columns=["LoanSequenceNumber", "ContractualDate",
+                                       "Schedueled Principal", "Monthly Installment"])
+    s_codes = pd.Index(uniques).get_indexer(sched["LoanSequenceNumber"])
+    s_months = datetime_to_month_index(sched["ContractualDate"])
+    keep = (s_codes >= 0) & ~np.isnan(s_months)
+    s_codes, s_months = s_codes[keep], s_months[keep]
+    s_principal = sched["Schedueled Principal"].to_numpy(dtype="float64")[keep]
+    s_installment = sched["Monthly Installment"].to_numpy(dtype="float64")[keep]
 
-    merged = merged.merge(
-        sched[["LoanSequenceNumber", "MonthlyReportingPeriod", "ScheduledPrincipalCurrent"]],
-        on=["LoanSequenceNumber", "MonthlyReportingPeriod"], how="left")
+    s_key = loan_month_key(s_codes, s_months)
+    s_order = sort_order(s_key)
+    if s_order is not None:
+        s_key, s_codes = s_key[s_order], s_codes[s_order]
+        s_principal, s_installment = s_principal[s_order], s_installment[s_order]
 
+    # Scheduled principal: binary search of the (sorted) panel keys in the (sorted) schedule keys
+    pos = np.searchsorted(s_key, key)
+    pos_c = np.minimum(pos, max(len(s_key) - 1, 0))
+    found = (pos < len(s_key)) & (s_key[pos_c] == key) if len(s_key) else np.zeros(len(key), bool)
+    principal = np.where(found, s_principal[pos_c] if len(s_key) else np.nan, np.nan)
 
-    # Previous UPB per loan
-    merged = merged.sort_values(["LoanSequenceNumber","MonthlyReportingPeriod"])
-    merged["UPB_prev"] = merged.groupby("LoanSequenceNumber")["CurrentActualUPB"].shift(1)
+    # Installment: first schedule row of each loan
+    installment_by_code = np.full(len(uniques), np.nan)
+    first_codes, first_pos = np.unique(s_codes, return_index=True)
+    installment_by_code[first_codes] = s_installment[first_pos]
 
+    return principal, installment_by_code
 
-    # Actual principal collected 
-    merged["ActualPrincipalCollected"] = (
-        (merged["UPB_prev"] - merged["CurrentActualUPB"]).astype(float)).fillna(0.0)  
 
+def align_prepayment_inputs(merged, sched) -> tuple[pd.DataFrame, np.ndarray]:
 
-    # Compute partial prepayment amount 
-    merged["PartialPrepayAmt"] = (
-        merged["ActualPrincipalCollected"].round(2) - merged["ScheduledPrincipalCurrent"].round(2))
-    
+    # Panel sorted by (loan, month) with scheduled principal, previous UPB and the raw partial
+    # prepayment amount; plus the installment of each row's loan
+    merged = load_panel(merged)
 
-    # build thresholds use to decide what is a significant prepayment - subjective choice 
-    per_loan_installment = (sched.groupby("LoanSequenceNumber")["Monthly Installment"].first())
+    # Sorted once; the frame is only reordered when it is not already in (loan, month) order
+    lp = LoanPanel(merged)
+    codes, months, key = lp.codes, lp.months, lp.key
+    out = lp.frame().copy(deep=False)
+    out.index = pd.RangeIndex(len(out)) if lp.order is None else lp.order
 
-    # Absolute epsilon per loan: 15% of that installment
-    ABS_EPS_by_loan = 0.15 * per_loan_installment
+    out["MonthlyReportingPeriod"] = month_index_to_datetime(months)
 
-    # Map this per-loan threshold to each row in merged
-    ABS_EPS_per_row = merged["LoanSequenceNumber"].map(ABS_EPS_by_loan)
+    principal, installment_by_code = _scheduled_values(
+        sched, out["LoanSequenceNumber"].to_numpy(), lp.ids, codes, months, key)
+    out["ScheduledPrincipalCurrent"] = principal
 
-    #minimum in dollars - since for a very small loans such as of 10K UPB the abs_eps will be also very small
-    MIN_EPS = 200.0
+    # Previous UPB per loan, NaN at each loan's first row
+    upb = out["CurrentActualUPB"].to_numpy(dtype="float64")
+    upb_prev = lp.shift(upb)
+    out["UPB_prev"] = upb_prev
 
-    threshold = ABS_EPS_per_row.clip(lower=MIN_EPS)
+    # Actual principal collected
+    collected = np.nan_to_num(upb_prev - upb, nan=0.0)
+    out["ActualPrincipalCollected"] = collected
 
-    
-    merged["PartialPrepayAmt"] = np.where(merged["PartialPrepayAmt"] > threshold, merged["PartialPrepayAmt"],0.0)
+    # Compute partial prepayment amount
+    out["PartialPrepayAmt"] = np.round(collected, 2) - np.round(principal, 2)
 
+    installment = lp.broadcast(installment_by_code)
+    return out, installment
 
-    # Indicators 
-    partial = ((merged["PartialPrepayAmt"] > 0) & (merged["ZeroBalanceCode"] == "not_applicable"))
 
-    full = (merged["ZeroBalanceCode"] == "1.0")
+def _classify(merged: pd.DataFrame, threshold: np.ndarray) -> pd.DataFrame:
 
-    # Categorical column
-    merged["PrepayType"] = 0
-    merged.loc[full, "PrepayType"] = 1
-    merged.loc[partial, "PrepayType"] = 2
+    amount = merged["PartialPrepayAmt"].to_numpy()
+    merged["PartialPrepayAmt"] = np.where(amount > threshold, amount, 0.0)
+
+
+    # Indicators
+    partial = ((merged["PartialPrepayAmt"] > 0) & (merged["ZeroBalanceCode"] == "not_applicable")).to_numpy()
 
-    merged["PrepayType"] = merged["PrepayType"].astype(int)
+    full = (merged["ZeroBalanceCode"] == "1.0").to_numpy()
+
+    # Categorical column
+    merged["PrepayType"] = np.where(partial, 2, np.where(full, 1, 0)).astype(int)
 
     return merged
 
+
+def add_prepayment_flags(merged, sched) -> pd.DataFrame:
+
+    merged, installment = align_prepayment_inputs(merged, sched)
+
+    # Per-loan threshold gathered to each row, floored at MIN_EPS
+    threshold = np.maximum(ABS_EPS_FRACTION * installment, MIN_EPS)
+
+    return _classify(merged, threshold)
+
+
+def _checkpoint_from_sorted(flagged: pd.DataFrame, installment: np.ndarray, threshold: np.ndarray) -> pd.DataFrame:
+
+    # Incremental mode state: LastPeriod, LastUPB, Installment, Threshold from the last row
+    # of each loan in a (loan, month)-sorted frame
+    ids = flagged["LoanSequenceNumber"].to_numpy()
+    last = np.ones(len(ids), dtype=bool)
+    last[:-1] = ids[1:] != ids[:-1]
+
+    return pd.DataFrame({
+        "LastPeriod": flagged["MonthlyReportingPeriod"].to_numpy()[last],
+        "LastUPB": flagged["CurrentActualUPB"].to_numpy(dtype="float64")[last],
+        "Installment": installment[last],
+        "Threshold": threshold[last],
+    }, index=pd.Index(ids[last], name="LoanSequenceNumber"))
+
+
+def build_prepayment_checkpoint(merged, sched) -> pd.DataFrame:
+
+    # Checkpoint of an already flagged history (one row per loan); save with to_parquet
+    aligned, installment = align_prepayment_inputs(merged, sched)
+    threshold = np.maximum(ABS_EPS_FRACTION * installment, MIN_EPS)
+    return _checkpoint_from_sorted(aligned, installment, threshold)
+
+
+def flag_new_months(new_rows, checkpoint: pd.DataFrame, sched, *, store=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    # Flags only the appended reporting months: the first new month of a known loan takes its
+    # previous UPB, installment and threshold from the checkpoint instead of the full history.
+    # Flagged rows carry the columns of new_rows plus the flags, no origination columns
+    # (e.g. MaturityDate): appended to `store`, those are NA in the new rows.
+    aligned, installment = align_prepayment_inputs(new_rows, sched)
+
+    pos = checkpoint.index.get_indexer(aligned["LoanSequenceNumber"])
+    known = pos >= 0
+    months = datetime_to_month_index(aligned["MonthlyReportingPeriod"])
+    last_months = datetime_to_month_index(checkpoint["LastPeriod"])
+
+    # Months at or before the checkpoint were already flagged
+    fresh = ~known | (months > np.where(known, last_months[pos], -np.inf))
+    if not fresh.all():
+        aligned, installment, pos, known = aligned[fresh], installment[fresh], pos[fresh], known[fresh]
+
+    ids = aligned["LoanSequenceNumber"].to_numpy()
+    first = np.ones(len(ids), dtype=bool)
+    first[1:] = ids[1:] != ids[:-1]
+    carry = first & known
+
+    # Previous UPB across the checkpoint boundary
+    upb = aligned["CurrentActualUPB"].to_numpy(dtype="float64")
+    upb_prev = aligned["UPB_prev"].to_numpy(dtype="float64").copy()
+    upb_prev[carry] = checkpoint["LastUPB"].to_numpy()[pos[carry]]
+    collected = np.nan_to_num(upb_prev - upb, nan=0.0)
+    aligned["UPB_prev"] = upb_prev
+    aligned["ActualPrincipalCollected"] = collected
+    aligned["PartialPrepayAmt"] = np.round(collected, 2) - np.round(aligned["ScheduledPrincipalCurrent"].to_numpy(), 2)
+
+    # Installment and threshold: checkpoint for known loans, schedule for new ones
+    installment = np.where(known, checkpoint["Installment"].to_numpy()[pos], installment)
+    threshold = np.where(known, checkpoint["Threshold"].to_numpy()[pos],
+                         np.maximum(ABS_EPS_FRACTION * installment, MIN_EPS))
+
+    flagged = _classify(aligned, threshold)
+
+    updated = _checkpoint_from_sorted(flagged, installment, threshold)
+    checkpoint = pd.concat([checkpoint.drop(index=updated.index, errors="ignore"), updated]).sort_index()
+
+    if store is not None:
+        store = store if isinstance(store, PanelStore) else PanelStore(store)
+        store.append_rows(flagged)
+
+    return flagged, checkpoint
+
+
+def prepayment_threshold_sweep(
+    merged,
+    sched,
+    fractions=(0.05, 0.10, 0.15, 0.20, 0.25, 0.30),
+    floors=(0.0, 100.0, 200.0, 500.0, 1000.0),
+    *,
+    output_dir: str = "Outputs/reports/data_analysis",
+    filename: str = "prepayment_threshold_sweep.csv",
+) -> pd.DataFrame:
+
+    # PrepayType counts for every (fraction, floor) pair from one pass over the panel.
+    # A row is a partial prepayment when amount > max(fraction * installment, floor),
+    # i.e. amount > floor and amount > fraction * installment: each row is binned once
+    # against the sorted floors and fractions, and the counts of every grid point are
+    # suffix sums of that 2-D histogram.
+    aligned, installment = align_prepayment_inputs(merged, sched)
+
+    fractions = np.unique(np.asarray(fractions, dtype="float64"))
+    floors = np.unique(np.asarray(floors, dtype="float64"))
+
+    amount = aligned["PartialPrepayAmt"].to_numpy(dtype="float64")
+    zb = aligned["ZeroBalanceCode"]
+    full = (zb == "1.0").to_numpy()
+
+    # Rows that can be partial under some threshold (NaN installment never passes, as in add_prepayment_flags)
+    cand = (zb == "not_applicable").to_numpy() & (amount > 0) & ~np.isnan(installment)
+    a, inst = amount[cand], installment[cand]
+
+    # Number of floors / fractions each row passes; fractions are tested on the same product
+    # as add_prepayment_flags, so rows at a floating-point boundary are classified alike
+    a_bin = np.searchsorted(floors, a, side="left")
+    r_bin = np.zeros(len(a), dtype=np.int64)
+    for f in fractions:
+        r_bin += a > f * inst
+
+    shape = (len(floors) + 1, len(fractions) + 1)
+    flat = a_bin * shape[1] + r_bin
+    size = shape[0] * shape[1]
+    hist_n = np.bincount(flat, minlength=size).reshape(shape)
+    hist_amt = np.bincount(flat, weights=a, minlength=size).reshape(shape)
+
+    # partial[j, i] = rows with a_bin > j and r_bin > i
+    def _suffix(h):
+        return h[::-1, ::-1].cumsum(axis=0).cumsum(axis=1)[::-1, ::-1][1:, 1:]
+
+    n_partial = _suffix(hist_n)
+    partial_amount = _suffix(hist_amt)
+
+    floor_grid, fraction_grid = np.meshgrid(floors, fractions, indexing="ij")
+    n_rows = len(aligned)
+    n_full = int(full.sum())
+
+    report = pd.DataFrame({
+        "abs_eps_fraction": fraction_grid.ravel(),
+        "min_eps": floor_grid.ravel(),
+        "n_rows": n_rows,
+        "n_no_prepay": n_rows - n_full - n_partial.ravel(),
+        "n_full_prepay": n_full,
+        "n_partial_prepay": n_partial.ravel(),
+        "partial_prepay_amount": partial_amount.ravel(),
+    })
+    report["partial_rate"] = report["n_partial_prepay"] / n_rows if n_rows else np.nan
+    report["full_rate"] = report["n_full_prepay"] / n_rows if n_rows else np.nan
+    report["is_current"] = (np.isclose(report["abs_eps_fraction"], ABS_EPS_FRACTION)
+                            & np.isclose(report["min_eps"], MIN_EPS))
+    report = report.sort_values(["abs_eps_fraction", "min_eps"], ignore_index=True)
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
+    return report
@@ -1,19 +1,152 @@
+import operator
+import numpy as np
 import pandas as pd
+from pathlib import Path
+from pandas.api.types import (is_bool_dtype, is_datetime64_any_dtype, is_float_dtype,
+                              is_integer_dtype, is_string_dtype)
 
-def run_accuracy_validity_score(df_dict, rules_dict):
-    total_checks_all = 0
-    total_violations_all = 0
 
+# Declarative rules, one dict per rule; each describes what a valid value looks like:
+#   {"col": c, "check": "range", "min": 0, "max": None, "min_inclusive": False, "max_inclusive": True}
+#   {"col": c, "check": "isin", "values": [...]}
+#   {"col": c, "check": "dtype", "dtype": "numeric" | "integer" | "float" | "string" | "datetime"}
+#   {"col": c, "check": "not_null"}
+#   {"col": c, "check": "length", "equals": 2}
+#   {"col": c, "check": "compare", "op": "<=", "other": other_col}
+# Missing values only violate "not_null", "isin" (unless listed) and "length". An optional
+# "name" labels the rule in the report. Legacy {"col": c, "condition": lambda x: ...} rules
+# (returning the violation mask) are still accepted.
+
+# Python types accepted per dtype rule, used where the dtype alone does not decide (object, category)
+_DTYPE_TYPES = {
+    "numeric": (int, float),
+    "integer": (int,),
+    "float": (float,),
+    "string": (str,),
+    "datetime": (pd.Timestamp,),
+}
+
+_OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+        "==": operator.eq, "!=": operator.ne}
+
+
+def _dtype_verdict(dtype, kind: str):
+
+    # True / False when every value of the dtype is / is not of the requested kind, None when
+    # the values have to be looked at (object, category)
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == object:
+        return None
+    if kind == "numeric":
+        return is_integer_dtype(dtype) or is_float_dtype(dtype) or is_bool_dtype(dtype)
+    if kind == "integer":
+        return is_integer_dtype(dtype) or is_bool_dtype(dtype)
+    if kind == "float":
+        return is_float_dtype(dtype)
+    if kind == "string":
+        return is_string_dtype(dtype)
+    if kind == "datetime":
+        return is_datetime64_any_dtype(dtype)
+    raise ValueError(f"Unknown dtype rule '{kind}'.")
+
+
+def _check_values(rule: dict, values, missing):
+
+    # Violation mask over an array of values (the column, or the categories of a categorical)
+    check = rule["check"]
+    if check == "range":
+        bad = np.zeros(len(values), dtype=bool)
+        v = np.asarray(values)
+        if rule.get("min") is not None:
+            bad |= (v < rule["min"]) if rule.get("min_inclusive", True) else (v <= rule["min"])
+        if rule.get("max") is not None:
+            bad |= (v > rule["max"]) if rule.get("max_inclusive", True) else (v >= rule["max"])
+        return bad & ~missing
+    if check == "isin":
+        return ~pd.Index(values).isin(list(rule["values"]))
+    if check == "length":
+        lengths = pd.Series(values, dtype=object).str.len().to_numpy(dtype="float64")
+        return lengths != rule["equals"]
+    if check == "not_null":
+        return missing
+    if check == "dtype":
+        types = _DTYPE_TYPES[rule["dtype"]]
+        return np.fromiter((not isinstance(v, types) for v in values), dtype=bool, count=len(values))
+    raise ValueError(f"Unknown rule check '{check}'.")
+
+
+def _violations(rule: dict, dataset: pd.DataFrame, column: pd.Series) -> np.ndarray:
+
+    if "condition" in rule:
+        mask = rule["condition"](column)
+        return (mask.fillna(False) if isinstance(mask, pd.Series) else pd.Series(mask)).to_numpy(dtype=bool)
+
+    check = rule["check"]
+    dtype = column.dtype
+
+    if check == "compare":
+        other = dataset[rule["other"]]
+        both = (column.notna() & other.notna()).to_numpy()
+        return both & ~np.asarray(_OPS[rule["op"]](column, other), dtype=bool)
+
+    if check == "dtype":
+        verdict = _dtype_verdict(dtype, rule["dtype"])
+        if verdict is not None:
+            # Answered from the dtype alone
+            return np.full(len(column), not verdict, dtype=bool)
+
+    # Categoricals: the rule is evaluated once per category (plus once for missing) and gathered by code
+    if isinstance(dtype, pd.CategoricalDtype):
+        cats = np.append(column.cat.categories.to_numpy(dtype=object), np.nan)
+        missing = np.zeros(len(cats), dtype=bool)
+        missing[-1] = True
+        return np.asarray(_check_values(rule, cats, missing), dtype=bool)[column.cat.codes.to_numpy()]
+
+    values = column.to_numpy()
+    return np.asarray(_check_values(rule, values, column.isna().to_numpy()), dtype=bool)
+
+
+def rule_violation_report(df_dict, rules_dict, *, sample_size: int = 5) -> pd.DataFrame:
+
+    # One row per applied rule: violation count and the index labels of the first offending rows.
+    # Rules are grouped by column so each column is fetched once.
+    rows = []
     for dataset_name, dataset in df_dict.items():
-        rules = rules_dict.get(dataset_name, [])
+        by_col = {}
+        for rule in rules_dict.get(dataset_name, []):
+            if rule["col"] in dataset.columns:
+                by_col.setdefault(rule["col"], []).append(rule)
+
         n_records = len(dataset)
+        for col, rules in by_col.items():
+            column = dataset[col]
+            for rule in rules:
+                bad = _violations(rule, dataset, column)
+                offending = np.flatnonzero(bad)
+                rows.append({
+                    "dataset": dataset_name,
+                    "rule": rule.get("name", f"{col}:{rule.get('check', 'condition')}"),
+                    "col": col,
+                    "n_records": n_records,
+                    "violations": int(offending.size),
+                    "violation_rate": offending.size / n_records if n_records else np.nan,
+                    "sample_rows": dataset.index[offending[:sample_size]].tolist(),
+                })
+
+    return pd.DataFrame(rows, columns=["dataset", "rule", "col", "n_records", "violations",
+                                       "violation_rate", "sample_rows"])
 
-        for rule in rules:
-            col = rule["col"]
-            if col in dataset.columns:
-                condition = rule["condition"](dataset[col])
-                total_violations_all += condition.sum()
-                total_checks_all += n_records  
+
+def run_accuracy_validity_score(
+    df_dict,
+    rules_dict,
+    *,
+    sample_size: int = 5,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "accuracy_validity_report.csv",
+):
+    report = rule_violation_report(df_dict, rules_dict, sample_size=sample_size)
+    total_checks_all = int(report["n_records"].sum())
+    total_violations_all = int(report["violations"].sum())
 
     score = (
         1 - (total_violations_all / total_checks_all)
@@ -21,4 +154,9 @@ def run_accuracy_validity_score(df_dict, rules_dict):
         else None
     )
 
+    # Save per-rule report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
     return pd.DataFrame([{"OverallAccuracyValidityScore": round(score, 4)}])
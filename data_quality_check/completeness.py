@@ -1,18 +1,24 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Optional, Tuple
+from pandas.api.types import is_datetime64_any_dtype
+from src.loan_panel import loan_month_key
+from src.format_variables_mortgages import datetime_to_month_index
 
-def completeness_score(
+def completeness_metrics(
     df1: pd.DataFrame,
     df2: Optional[pd.DataFrame] = None,
-    id_col: Optional[str] = None,
-    date_col: Optional[str] = None,
-    output_dir: str = "Outputs/reports/Quality_Results",
-    filename: str = "completeness_report.csv",
+    codes: Optional[np.ndarray] = None,
+    n_loans: int = 0,
+    months: Optional[np.ndarray] = None,
     first_period_after_year: Optional[int] = 2011,
     exclude_cols: Optional[list[str]] = None
-) -> Tuple[float, pd.DataFrame, Optional[pd.DataFrame]]:
-   
+) -> Tuple[dict, Optional[np.ndarray]]:
+
+    # Report metrics of completeness_score and, per loan, whether it is dropped (gaps or first
+    # period after the cutoff). codes / months: loan code (n_loans for a missing ID) and month
+    # index of every df2 row, in any row order; without them there is no gap check.
     exclude_cols = exclude_cols or []
     frames = [df1] if df2 is None else [df1, df2]
 
@@ -28,44 +34,35 @@ def completeness_score(
 
     # Type 2: Temporal Gaps 
     total_gaps = 0
-    loans_with_gaps: list[str] = []
-    loans_first_after_cutoff: list[str] = []
+    with_gaps = after_cutoff = None
 
-    if (
-        df2 is not None
-        and id_col is not None and date_col is not None
-        and id_col in df2.columns and date_col in df2.columns
-    ):
-        perf = df2[[id_col, date_col]].copy()
-        perf[date_col] = pd.to_datetime(perf[date_col], errors="coerce")
+    if codes is not None:
 
-        # Build integer month 
-        perf["period_int"] = perf[date_col].dt.year * 12 + perf[date_col].dt.month
-        perf = perf.sort_values([id_col, "period_int"])
-        perf["prev_period"] = perf.groupby(id_col)["period_int"].shift(1)
-        perf["gap"] = perf["period_int"] - perf["prev_period"]
+        # Per-loan first month, last month and month count, without sorting the panel
+        valid = ~np.isnan(months)
+        c, m = codes[valid], months[valid].astype(np.int64)
+        count = np.bincount(c, minlength=n_loans + 1)
+        first = np.full(n_loans + 1, np.iinfo(np.int64).max)
+        last = np.full(n_loans + 1, np.iinfo(np.int64).min)
+        np.minimum.at(first, c, m)
+        np.maximum.at(last, c, m)
 
-        # Count months missing 
-        total_gaps = int(perf.loc[perf["gap"] > 1, "gap"].sub(1).sum())
+        # Exact fallback for loans with duplicate periods: count each month once
+        dup = pd.Series(loan_month_key(c, m)).duplicated().to_numpy()
+        if dup.any():
+            count -= np.bincount(c[dup], minlength=n_loans + 1)
+
+        # Months missing inside each loan's span (rows with a missing ID are never checked)
+        loan_gaps = np.where(count > 0, last - first + 1 - count, 0)[:n_loans]
+        total_gaps = int(loan_gaps.sum())
 
         # Loans with any internal gap
-        loans_with_gaps = (
-            perf.loc[perf["gap"] > 1, id_col]
-                .dropna()
-                .astype(str)
-                .unique()
-                .tolist()
-        )
+        with_gaps = loan_gaps > 0
 
         # Loans whose first reporting month is after the cutoff year
+        after_cutoff = np.zeros(n_loans, dtype=bool)
         if first_period_after_year is not None:
-            first_dates = perf.groupby(id_col, dropna=True)[date_col].min().dropna()
-            first_years = first_dates.dt.year
-            loans_first_after_cutoff = (
-                first_years[first_years > int(first_period_after_year)]
-                .index.astype(str)
-                .tolist()
-            )
+            after_cutoff = (count[:n_loans] > 0) & (first[:n_loans] // 12 > int(first_period_after_year))
 
     # Combining missing values + implied gap "cells" 
     gap_cells = 0
@@ -79,30 +76,64 @@ def completeness_score(
     total_missing_fraction = (total_missing / expected_cells) if expected_cells > 0 else 0.0
     completeness = 1.0 - total_missing_fraction
 
-    # Save report 
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
     results = {
         "Total Cells": int(expected_cells),
         "Type 1 missing values": int(missing),
         "Type 2 gap months": int(total_gaps),
         "Type 2 gap cells": int(gap_cells),
-        "Loans_with_Gaps": int(len(loans_with_gaps)),
+        "Loans_with_Gaps": int(with_gaps.sum()) if with_gaps is not None else 0,
         "Cutoff_FirstPeriod_After_Year": (
             int(first_period_after_year) if first_period_after_year is not None else None
         ),
-        "Loans_FirstPeriod_After_Cutoff": int(len(loans_first_after_cutoff)),
+        "Loans_FirstPeriod_After_Cutoff": int(after_cutoff.sum()) if after_cutoff is not None else 0,
         "Completeness_Score": round(float(completeness), 6),
     }
+    return results, (None if with_gaps is None else with_gaps | after_cutoff)
+
+
+def completeness_score(
+    df1: pd.DataFrame,
+    df2: Optional[pd.DataFrame] = None,
+    id_col: Optional[str] = None,
+    date_col: Optional[str] = None,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "completeness_report.csv",
+    first_period_after_year: Optional[int] = 2011,
+    exclude_cols: Optional[list[str]] = None
+) -> Tuple[float, pd.DataFrame, Optional[pd.DataFrame]]:
+   
+    ids = codes = months = None
+    if (
+        df2 is not None
+        and id_col is not None and date_col is not None
+        and id_col in df2.columns and date_col in df2.columns
+    ):
+        dates = df2[date_col]
+        if not is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors="coerce")
+        months = datetime_to_month_index(dates)
+
+        # Integer loan codes; rows with a missing ID go to one extra group that is never checked
+        codes, ids = pd.factorize(df2[id_col])
+        codes = np.where(codes < 0, len(ids), codes)
+
+    results, drop = completeness_metrics(
+        df1, df2, codes, 0 if ids is None else len(ids), months,
+        first_period_after_year=first_period_after_year, exclude_cols=exclude_cols,
+    )
+
+    # Save report 
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
     pd.DataFrame(results.items(), columns=["Metric", "Value"]).to_csv(
         Path(output_dir) / filename, index=False
     )
 
-    # Drop BOTH sets: gaps + after-cutoff 
-    to_drop = set(loans_with_gaps) | set(loans_first_after_cutoff)
-    if to_drop:
-        if df2 is not None and id_col in df2.columns:
-            df2 = df2[~df2[id_col].astype(str).isin(to_drop)].copy()
+    # Drop BOTH sets: gaps + after-cutoff, matched on the integer loan codes
+    if drop is not None and drop.any():
+        drop = np.append(drop, False)
+        df2 = df2[~drop[codes]].copy()
         if id_col in df1.columns:
-            df1 = df1[~df1[id_col].astype(str).isin(to_drop)].copy()
+            codes1 = ids.get_indexer(df1[id_col].to_numpy())
+            df1 = df1[~drop[np.where(codes1 < 0, len(ids), codes1)]].copy()
 
-    return round(float(completeness), 6), df1, df2
+    return results["Completeness_Score"], df1, df2
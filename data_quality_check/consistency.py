@@ -2,36 +2,55 @@ from typing import Dict, Tuple, Optional
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from src.loan_panel import LoanPanel
+from src.loan_indicators import rate_modification_indicators
 
 
-def run_consistency_checks(
+def consistency_metrics(
     df1: pd.DataFrame,
     df2: pd.DataFrame,
+    lp: Optional[LoanPanel] = None,
     *,
     id_col: Optional[str] = None,
     date_col: Optional[str] = None,
     cross_field_tuple: Optional[Tuple[str, str, str]] = None,
     rate_col: Optional[str] = None,
     mod_col: Optional[str] = None,
-    output_dir: str = "Outputs/reports/Quality_Results",
-    filename: str = "consistency_report.csv",
-) -> Tuple[pd.DataFrame, Dict[str, float]]:
-   
+    keep: Optional[np.ndarray] = None,
+) -> Tuple[Dict[str, float], Optional[np.ndarray]]:
 
+    # Report metrics of run_consistency_checks and the modified loans it drops. lp: df2 grouped
+    # by loan in file order (None without an ID column); keep: per-loan mask of lp codes still
+    # in scope (last entry: missing IDs), so rows of dropped loans are skipped without filtering
     results: Dict[str, int | float] = {}
+    modified = None
+
+    if lp is not None:
+        keep = np.ones(lp.n_loans + 1, dtype=bool) if keep is None else keep
+        row_keep = keep[lp.codes]
+        orig_keep = keep[lp.codes_of(df1[id_col])] if id_col in df1.columns else np.ones(len(df1), dtype=bool)
+    else:
+        row_keep = np.ones(len(df2), dtype=bool)
+        orig_keep = np.ones(len(df1), dtype=bool)
 
 
     # Temporal monotonicity check 
     if id_col and date_col and {id_col, date_col}.issubset(df2.columns):
-        df_temp = df2[[id_col, date_col]].copy()
-        df_temp["prev_date"] = df_temp.groupby(id_col)[date_col].shift(1)
-        results["Temporal_Monotonicity_Violations"] = int((df_temp[date_col] < df_temp["prev_date"]).sum())
+        dates = lp.column(date_col)
+        prev = lp.shift(dates)
+
+        # Only rows with a date and a dated predecessor in the same loan are compared, so
+        # object dates (e.g. "2020-01" strings) are never ordered against a missing value
+        both = ~pd.isna(dates) & ~pd.isna(prev)
+        earlier = np.zeros(len(dates), dtype=bool)
+        earlier[both] = dates[both] < prev[both]
+        results["Temporal_Monotonicity_Violations"] = int((earlier & row_keep).sum())
 
 
     # IDs map check 
     if id_col and id_col in df1.columns and id_col in df2.columns:
-       ids_1 = set(df1[id_col].dropna())
-       ids_2 = set(df2[id_col].dropna())
+       ids_1 = pd.Index(df1[id_col].to_numpy()[orig_keep]).dropna().unique()
+       ids_2 = lp.ids[keep[:-1]]
        results["ID_Difference_Count"] = len(ids_1.symmetric_difference(ids_2))
 
 
@@ -39,36 +58,27 @@ def run_consistency_checks(
     # Cross-field rule check 
     if cross_field_tuple and all(f in df2.columns for f in cross_field_tuple):
         f1, f2, ref = cross_field_tuple
-        tmp = df2[[f1, f2, ref]].copy()
+        tmp = df2[[f1, f2, ref]]
         mask = (tmp[f1].notna()) & (tmp[f2] == "not_applicable") & (tmp[ref] != 0)
-        results["Cross_Field_Violations"] = int(mask.sum())
+        rows = row_keep if lp is None else lp.to_input_order(row_keep)
+        results["Cross_Field_Violations"] = int((mask.to_numpy() & rows).sum())
 
 
     # Interest-rate modification consistency check 
     if id_col and rate_col and mod_col and {id_col, rate_col, mod_col}.issubset(df2.columns):
-      df2 = df2.copy()
-      df2["prev_rate"] = df2.groupby(id_col)[rate_col].shift()
-      df2["rate_changed"] = df2["prev_rate"].notna() & (df2[rate_col] != df2["prev_rate"])
-
+        flags = rate_modification_indicators(lp, rate_col, mod_col)
+        rate_changed = flags["rate_changed"].to_numpy() & keep[:-1]
+        modified = flags["modified"].to_numpy() & keep[:-1]
 
-    # Identify per-loan flags
-    rate_changed = df2.groupby(id_col)["rate_changed"].any()
-    modified = df2.groupby(id_col)[mod_col].apply(lambda x: (x == "Y").any())
+        results["Loans_with_Rate_Changes"] = int(rate_changed.sum())
+        results["Loans_with_Modifications"] = int(modified.sum())
+        results["Loans_with_Both"] = int((rate_changed & modified).sum())
 
-    n_varying_rates = int(rate_changed.sum())
-    n_modified_loans = int(modified.sum())
-    n_both = int((rate_changed & modified).sum())
-
-    results["Loans_with_Rate_Changes"] = n_varying_rates
-    results["Loans_with_Modifications"] = n_modified_loans
-    results["Loans_with_Both"] = n_both
-
-
-    # Drop loans with varying interest rate
-    remove_ids = rate_changed.index[modified]
-    df2 = df2[~df2[id_col].isin(remove_ids)].copy()
-    if id_col in df1.columns:
-        df1 = df1[~df1[id_col].isin(remove_ids)].copy()
+        # Modified loans are dropped before the score is taken
+        drop = np.append(modified, False)
+        row_keep = row_keep & ~drop[lp.codes]
+        if id_col in df1.columns:
+            orig_keep = orig_keep & ~drop[lp.codes_of(df1[id_col])]
 
 
 
@@ -82,8 +92,8 @@ def run_consistency_checks(
     total_violations = sum(results[k] for k in violation_keys if k in results)
 
 
-    n_loans = df1[id_col].nunique()
-    n_rows = len(df2)
+    n_loans = df1[id_col][orig_keep].nunique()
+    n_rows = int(row_keep.sum())
 
     row_level_checks = ["Temporal_Monotonicity_Violations", "Cross_Field_Violations"]
     loan_level_checks = ["Loans_with_Rate_Changes"]
@@ -98,6 +108,38 @@ def run_consistency_checks(
     results["Consistency_Score"] = (round(1 - total_violations / denom, 3)
     if denom and denom > 0 else np.nan)
 
+    return results, modified
+
+
+def run_consistency_checks(
+    df1: pd.DataFrame,
+    df2: pd.DataFrame,
+    *,
+    id_col: Optional[str] = None,
+    date_col: Optional[str] = None,
+    cross_field_tuple: Optional[Tuple[str, str, str]] = None,
+    rate_col: Optional[str] = None,
+    mod_col: Optional[str] = None,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "consistency_report.csv",
+) -> Tuple[pd.DataFrame, Dict[str, float]]:
+   
+
+    # Rows grouped by loan once (file order kept within a loan), shared by the sequential checks
+    lp = LoanPanel(df2, id_col, date_col=None) if id_col and id_col in df2.columns else None
+
+    results, modified = consistency_metrics(
+        df1, df2, lp, id_col=id_col, date_col=date_col, cross_field_tuple=cross_field_tuple,
+        rate_col=rate_col, mod_col=mod_col,
+    )
+
+    # Drop modified loans, matched on the loan codes (rows with a missing ID are kept)
+    if modified is not None:
+        drop = np.append(modified, False)
+        df2 = df2[~lp.to_input_order(drop[lp.codes])].copy()
+        if id_col in df1.columns:
+            df1 = df1[~drop[lp.codes_of(df1[id_col])]].copy()
+
 # Save report
     output_path = Path.cwd() / output_dir
     output_path.mkdir(parents=True, exist_ok=True)
@@ -105,9 +147,4 @@ def run_consistency_checks(
     pd.DataFrame(results.items(), columns=["Check", "Value"]).to_csv(
     output_path / filename, index=False)
 
-    for col in ["prev_rate", "rate_changed"]:
-        if col in df2.columns:
-            df2 = df2.drop(columns=col)
-
     return df1, df2, results
-
@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from src.cache import cache_key, read_manifest, write_manifest, file_fingerprint
+from src.format_variables_mortgages import datetime_to_month_index, month_index_to_datetime, loan_id_vintage
+from data_quality_check.sketches import hash_rows
+
+
+# Population stability against a frozen reference: numeric columns are cut at the reference
+# deciles (plus a missing bin), categoricals at the reference levels (plus "other" for
+# unseen levels and a missing bin). PSI is computed on those bins; KS on the reference
+# percentile grid, so it is exact up to the largest share of either sample between two
+# adjacent grid points.
+
+PSI_EPS = 1e-4
+PSI_LEVELS = [(0.1, "stable"), (0.25, "moderate")]          # above the last: "shift"
+
+
+def _psi(ref: np.ndarray, cur: np.ndarray) -> np.ndarray:
+    p = np.maximum(ref, PSI_EPS)
+    q = np.maximum(cur, PSI_EPS)
+    return ((q - p) * np.log(q / p)).sum(axis=-1)
+
+
+def _reference_sources(ref) -> list:
+    if isinstance(ref, pd.DataFrame):
+        return [ref]
+    path = Path(ref)
+    return sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+
+
+def _load(source, columns) -> pd.DataFrame:
+    if isinstance(source, pd.DataFrame):
+        return source[[c for c in columns if c in source.columns]]
+    return pq.read_table(source, columns=list(columns)).to_pandas()
+
+
+def reference_bins(
+    ref,
+    *,
+    numeric_cols=(),
+    categorical_cols=(),
+    n_bins: int = 10,
+    ks_points: int = 99,
+    max_levels: int = 50,
+    cache_path=None,
+) -> dict:
+
+    # Bin edges, KS grid and category levels of the reference (a DataFrame, a Parquet file or
+    # a directory of Parquet files), with the reference shares. Cached as JSON at cache_path,
+    # keyed by the reference contents and the settings.
+    numeric_cols, categorical_cols = list(numeric_cols), list(categorical_cols)
+    sources = _reference_sources(ref)
+    settings = dict(numeric_cols=numeric_cols, categorical_cols=categorical_cols,
+                    n_bins=n_bins, ks_points=ks_points, max_levels=max_levels)
+    if cache_path is not None:
+        content = [file_fingerprint(s) if not isinstance(s, pd.DataFrame)
+                   else [len(s), int(hash_rows(s[numeric_cols + categorical_cols]).sum(dtype=np.uint64))]
+                   for s in sources]
+        key = cache_key(content=content, **settings)
+        cached = read_manifest(cache_path)
+        if cached.get("key") == key:
+            return cached["reference"]
+
+    frame = pd.concat([_load(s, numeric_cols + categorical_cols) for s in sources], ignore_index=True)
+    reference = {"n_rows": len(frame), "numeric": {}, "categorical": {}}
+
+    for col in numeric_cols:
+        v = pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype="float64")
+        valid = v[~np.isnan(v)]
+        if len(valid) == 0:
+            continue
+        edges = np.unique(np.quantile(valid, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        grid = np.unique(np.quantile(valid, np.linspace(0, 1, ks_points + 2)[1:-1]))
+        entry = {"edges": edges.tolist(), "ks_grid": grid.tolist()}
+        entry.update(_numeric_shares(entry, v, np.zeros(len(v), dtype=np.int64), 1))
+        reference["numeric"][col] = {k: (val[0].tolist() if isinstance(val, np.ndarray) else val)
+                                     for k, val in entry.items()}
+
+    for col in categorical_cols:
+        s = frame[col]
+        counts = s.astype(object).value_counts(dropna=True)
+        levels = [str(x) for x in counts.index[:max_levels]]
+        entry = {"levels": levels}
+        entry.update(_categorical_shares(entry, s, np.zeros(len(s), dtype=np.int64), 1))
+        reference["categorical"][col] = {k: (val[0].tolist() if isinstance(val, np.ndarray) else val)
+                                         for k, val in entry.items()}
+
+    if cache_path is not None:
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        write_manifest(cache_path, key, reference=reference)
+    return reference
+
+
+def _numeric_shares(entry: dict, v: np.ndarray, group: np.ndarray, n_groups: int) -> dict:
+
+    # Per group: counts on the PSI bins (last bin = missing) and on the KS grid (values <= point)
+    edges, grid = np.asarray(entry["edges"]), np.asarray(entry["ks_grid"])
+    missing = np.isnan(v)
+    nb = len(edges) + 2
+    b = np.where(missing, nb - 1, np.searchsorted(edges, v, side="left"))
+    counts = np.bincount(group * nb + b, minlength=n_groups * nb).reshape(n_groups, nb)
+
+    ng = len(grid) + 1
+    k = np.searchsorted(grid, v[~missing], side="left")
+    below = np.bincount(group[~missing] * ng + k, minlength=n_groups * ng).reshape(n_groups, ng)
+    return {"counts": counts, "ks_counts": below}
+
+
+def _categorical_shares(entry: dict, s: pd.Series, group: np.ndarray, n_groups: int) -> dict:
+
+    # Per group: counts on the reference levels, then "other" (unseen) and missing
+    levels = pd.Index(entry["levels"])
+    nb = len(levels) + 2
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        lookup = np.append(levels.get_indexer(s.cat.categories.astype(str)), -2)
+        idx = lookup[s.cat.codes.to_numpy()]
+    else:
+        values = s.to_numpy(dtype=object)
+        idx = np.full(len(values), -2)
+        known = ~pd.isna(values)
+        idx[known] = levels.get_indexer(values[known].astype(str))
+    b = np.where(idx == -2, nb - 1, np.where(idx < 0, nb - 2, idx))
+    counts = np.bincount(group * nb + b, minlength=n_groups * nb).reshape(n_groups, nb)
+    return {"counts": counts}
+
+
+def _group_keys(chunk: pd.DataFrame, by: str, id_col: str, date_col: str) -> np.ndarray:
+
+    # "month": reporting month index, "vintage": the vintage column or the year in the loan ID, else a column
+    if by == "month":
+        return datetime_to_month_index(chunk[date_col])
+    if by == "vintage":
+        return chunk["vintage"].to_numpy(dtype="float64") if "vintage" in chunk.columns else loan_id_vintage(chunk[id_col])
+    return chunk[by].to_numpy()
+
+
+def _count_chunk(chunk: pd.DataFrame, reference: dict, by: str, id_col: str, date_col: str) -> dict:
+
+    keys, group = np.unique(_group_keys(chunk, by, id_col, date_col), return_inverse=True)
+    group = group.ravel().astype(np.int64)
+    out = {}
+    for col, entry in reference["numeric"].items():
+        if col in chunk.columns:
+            v = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype="float64")
+            out[col] = _numeric_shares(entry, v, group, len(keys))
+    for col, entry in reference["categorical"].items():
+        if col in chunk.columns:
+            out[col] = _categorical_shares(entry, chunk[col], group, len(keys))
+    return {"keys": keys, "columns": out}
+
+
+def _add_counts(total: dict, col: str, name: str, frame: pd.DataFrame) -> None:
+
+    # Counts keyed by group value, summed over chunks and files
+    slot = total.setdefault(col, {})
+    slot[name] = frame if name not in slot else slot[name].add(frame, fill_value=0)
+
+
+def _merge_counts(total: dict, part: dict) -> dict:
+    for col, arrays in part["columns"].items():
+        for name, counts in arrays.items():
+            _add_counts(total, col, name, pd.DataFrame(counts, index=part["keys"]))
+    return total
+
+
+def _count_file(path, columns, reference, by, id_col, date_col, batch_rows) -> dict:
+
+    # Lake files carry their vintage in the Hive path (vintage=2010), not in the file
+    partitions = dict(part.split("=", 1) for part in Path(path).parent.parts if "=" in part)
+    total = {}
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+        chunk = batch.to_pandas()
+        if by == "vintage" and "vintage" in partitions:
+            chunk["vintage"] = float(partitions["vintage"])
+        _merge_counts(total, _count_chunk(chunk, reference, by, id_col, date_col))
+    return total
+
+
+def drift_report(
+    source,
+    reference: dict,
+    *,
+    by: str = "month",
+    id_col: str = "LoanSequenceNumber",
+    date_col: str = "MonthlyReportingPeriod",
+    batch_rows: int = 1_000_000,
+    max_workers=None,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "drift_report.csv",
+) -> pd.DataFrame:
+
+    # PSI and KS of every reference variable per group (by="month", "vintage" or a column) of
+    # source: a DataFrame, a Parquet file or a directory of Parquet files (e.g. the perf lake).
+    # Parquet files are counted in parallel worker processes; only bin counts travel back.
+    cols = list(reference["numeric"]) + list(reference["categorical"])
+    needed = cols + ([date_col] if by == "month" else [id_col] if by == "vintage" else [by])
+    needed = list(dict.fromkeys(needed))
+
+    total = {}
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), batch_rows):
+            chunk = source.iloc[start:start + batch_rows]
+            _merge_counts(total, _count_chunk(chunk, reference, by, id_col, date_col))
+    else:
+        path = Path(source)
+        files = sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_count_file, f, needed, reference, by, id_col, date_col, batch_rows)
+                       for f in files]
+            for f in futures:
+                for col, arrays in f.result().items():
+                    for name, frame in arrays.items():
+                        _add_counts(total, col, name, frame)
+
+    rows = []
+    for col in cols:
+        if col not in total:
+            continue
+        entry = reference["numeric"].get(col) or reference["categorical"][col]
+        counts = total[col]["counts"].sort_index()
+        counts = counts[counts.index.notna()] if counts.index.dtype.kind == "f" else counts
+        n = counts.to_numpy().sum(axis=1)
+        shares = counts.to_numpy() / np.maximum(n, 1)[:, None]
+        ref_counts = np.asarray(entry["counts"], dtype="float64")
+        psi = _psi(ref_counts / ref_counts.sum(), shares)
+
+        ks = np.full(len(counts), np.nan)
+        if "ks_counts" in total[col]:
+            below = total[col]["ks_counts"].reindex(counts.index, fill_value=0).to_numpy()
+            cdf = np.cumsum(below, axis=1)[:, :-1] / np.maximum(below.sum(axis=1), 1)[:, None]
+            ref_below = np.asarray(entry["ks_counts"], dtype="float64")
+            ref_cdf = np.cumsum(ref_below)[:-1] / ref_below.sum()
+            ks = np.where(below.sum(axis=1) > 0, np.abs(cdf - ref_cdf).max(axis=1, initial=0.0), np.nan)
+
+        rows.append(pd.DataFrame({
+            "group": counts.index,
+            "variable": col,
+            "type": "numeric" if col in reference["numeric"] else "categorical",
+            "n_rows": n.astype(np.int64),
+            "missing_%": 100 * shares[:, -1],
+            "psi": psi,
+            "ks": ks,
+        }))
+
+    report = (pd.concat(rows, ignore_index=True) if rows
+              else pd.DataFrame(columns=["group", "variable", "type", "n_rows", "missing_%", "psi", "ks"]))
+    report["status"] = np.select([report["psi"] < t for t, _ in PSI_LEVELS], [s for _, s in PSI_LEVELS], "shift")
+    if by == "month":
+        report["group"] = month_index_to_datetime(report["group"].to_numpy(dtype="float64"))
+    report = report.sort_values(["variable", "group"], kind="stable").reset_index(drop=True)
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
+    return report
@@ -0,0 +1,200 @@
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from functools import cached_property
+from pandas.api.types import is_datetime64_any_dtype
+from src.loan_panel import LoanPanel
+from data_quality_check.accuracy_validity import rule_violation_report
+from data_quality_check.completeness import completeness_metrics
+from data_quality_check.consistency import consistency_metrics
+from data_quality_check.uniqueness import duplicate_counts
+from data_quality_check.outlier import outlier_stats, outlier_score
+
+
+# Checks run in registration order; each takes the shared QualityContext and returns its metrics
+CHECKS = {}
+
+# Per-column outlier metrics reported by the engine
+OUTLIER_SHARES = ["IQR_outliers_%", "Z_outliers_%", "MZ_outliers_%"]
+
+
+def register_check(name: str):
+
+    def decorator(func):
+        CHECKS[name] = func
+        return func
+    return decorator
+
+
+class QualityContext:
+
+    # Shared state of one engine run: the performance table grouped by loan once and which
+    # loans are still in scope. The checks call the check modules' metric functions with these
+    # panels; checks that drop loans only update `loan_keep`, and the tables themselves are
+    # filtered once, at the end of the run.
+
+    def __init__(self, orig, perf, *, id_col, date_col, rate_col=None, mod_col=None,
+                 cross_field_tuple=None, first_period_after_year=2011, exclude_cols=None,
+                 accuracy_rules=None, id_cols_orig=None, id_cols_perf=None, outlier_cols=None,
+                 z_thr=3.0, mz_thr=3.5):
+
+        self.orig, self.perf = orig, perf
+        self.id_col, self.date_col = id_col, date_col
+        self.rate_col, self.mod_col = rate_col, mod_col
+        self.cross_field_tuple = cross_field_tuple
+        self.first_period_after_year = first_period_after_year
+        self.exclude_cols = exclude_cols or []
+        self.accuracy_rules = accuracy_rules or {}
+        self.id_cols_orig = id_cols_orig
+        self.id_cols_perf = id_cols_perf
+        self.outlier_cols = outlier_cols or []
+        self.z_thr, self.mz_thr = z_thr, mz_thr
+
+        # Loan-month order for gaps and duplicates (unparseable dates count as missing)
+        source = perf if is_datetime64_any_dtype(perf[date_col]) else \
+            perf.assign(**{date_col: pd.to_datetime(perf[date_col], errors="coerce")})
+        self.lp = LoanPanel(source, id_col, date_col)
+
+        # Last entry stands for rows with a missing loan ID, which are never dropped
+        self.loan_keep = np.ones(self.lp.n_loans + 1, dtype=bool)
+        self.scores = {}
+
+    @cached_property
+    def lp_file(self) -> LoanPanel:
+
+        # File order within each loan (temporal and rate checks); the loan-month panel is reused
+        # when the input is already in that order, which is the usual case
+        return self.lp if self.lp.order is None else LoanPanel(self.perf, self.id_col, date_col=None)
+
+    @property
+    def row_keep(self) -> np.ndarray:
+        return self.loan_keep[self.lp.codes]
+
+    def drop_loans(self, mask) -> None:
+
+        # Per-loan mask aligned with lp.ids; rows with a missing ID are never dropped
+        if mask is not None:
+            self.loan_keep[:-1] &= ~mask
+
+    @cached_property
+    def orig_codes(self) -> np.ndarray:
+        return self.lp.codes_of(self.orig[self.id_col])
+
+    @property
+    def orig_keep(self) -> np.ndarray:
+
+        # Origination rows of loans that are not in the performance table are never dropped
+        return self.loan_keep[self.orig_codes]
+
+
+@register_check("accuracy_validity")
+def _accuracy_validity(ctx: QualityContext) -> dict:
+
+    report = rule_violation_report({"orig": ctx.orig, "perf": ctx.perf}, ctx.accuracy_rules)
+    total_checks, total_violations = int(report["n_records"].sum()), int(report["violations"].sum())
+
+    score = 1 - total_violations / total_checks if total_checks > 0 else None
+    ctx.scores["Accuracy & Validity"] = None if score is None else round(score, 4)
+    return {"Total_Checks": int(total_checks), "Total_Violations": int(total_violations),
+            "OverallAccuracyValidityScore": ctx.scores["Accuracy & Validity"]}
+
+
+@register_check("completeness")
+def _completeness(ctx: QualityContext) -> dict:
+
+    results, drop = completeness_metrics(
+        ctx.orig, ctx.perf, ctx.lp.codes, ctx.lp.n_loans, ctx.lp.months,
+        first_period_after_year=ctx.first_period_after_year, exclude_cols=ctx.exclude_cols,
+    )
+    ctx.drop_loans(drop)
+    ctx.scores["Completeness"] = results["Completeness_Score"]
+    return results
+
+
+@register_check("consistency")
+def _consistency(ctx: QualityContext) -> dict:
+
+    results, modified = consistency_metrics(
+        ctx.orig, ctx.perf, ctx.lp_file, id_col=ctx.id_col, date_col=ctx.date_col,
+        cross_field_tuple=ctx.cross_field_tuple, rate_col=ctx.rate_col, mod_col=ctx.mod_col,
+        keep=ctx.loan_keep,
+    )
+    ctx.drop_loans(modified)
+    ctx.scores["Consistency"] = results["Consistency_Score"]
+    return results
+
+
+@register_check("uniqueness")
+def _uniqueness(ctx: QualityContext) -> dict:
+
+    results, total_records = duplicate_counts(
+        ctx.orig, ctx.perf, ctx.id_cols_orig, ctx.id_cols_perf, lp=ctx.lp, keep=ctx.loan_keep,
+    )
+    score = 1 - (results["duplicates_df1"] + results["duplicates_df2"]) / total_records if total_records else 0.0
+    ctx.scores["Uniqueness"] = round(score, 6)
+    return {**results, "Uniqueness_Score": ctx.scores["Uniqueness"]}
+
+
+@register_check("outliers")
+def _outliers(ctx: QualityContext) -> dict:
+
+    rows = []
+    row_keep = ctx.lp.to_input_order(ctx.row_keep)
+    for c in ctx.outlier_cols:
+        x = pd.to_numeric(ctx.perf[c], errors="coerce").to_numpy(dtype="float64")[row_keep]
+        x = x[~np.isnan(x)]
+        stats = outlier_stats(x, ctx.z_thr, ctx.mz_thr) if len(x) else {}
+        rows.append({"column": c, **{m: stats.get(m, np.nan) for m in OUTLIER_SHARES}})
+
+    report = pd.DataFrame(rows, columns=["column", *OUTLIER_SHARES]).set_index("column")
+    ctx.scores["Outliers"] = outlier_score(report)
+    results = {f"{c}_{m}": v for c, row in report.iterrows() for m, v in row.items()}
+    results["Outlier_Score"] = ctx.scores["Outliers"]
+    return results
+
+
+def run_quality_checks(
+    orig: pd.DataFrame,
+    perf: pd.DataFrame,
+    *,
+    id_col: str = "LoanSequenceNumber",
+    date_col: str = "MonthlyReportingPeriod",
+    checks=None,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "quality_engine_report.csv",
+    timing_filename: str = "quality_engine_timing.csv",
+    **options,
+):
+    # Runs the registered checks in order over one shared context. Metrics and scores match the
+    # individual check functions run in the notebook's order (completeness drops loans with gaps
+    # or late first periods, consistency then drops modified loans); boxplots and per-check
+    # report files are not produced. options: see QualityContext.
+    t0 = time.perf_counter()
+    ctx = QualityContext(orig, perf, id_col=id_col, date_col=date_col, **options)
+    timings = [{"check": "shared_panel", "seconds": time.perf_counter() - t0}]
+
+    rows = []
+    for name in (CHECKS if checks is None else checks):
+        t0 = time.perf_counter()
+        metrics = CHECKS[name](ctx)
+        timings.append({"check": name, "seconds": time.perf_counter() - t0})
+        rows += [{"check": name, "metric": k, "value": v} for k, v in metrics.items()]
+
+    # Filtered tables, materialized once
+    t0 = time.perf_counter()
+    orig_out = orig[ctx.orig_keep].copy()
+    perf_out = perf[ctx.lp.to_input_order(ctx.row_keep)].copy()
+    timings.append({"check": "filter_tables", "seconds": time.perf_counter() - t0})
+
+    report = pd.DataFrame(rows, columns=["check", "metric", "value"])
+    timings = pd.DataFrame(timings)
+    timings["rows"] = len(perf)
+
+    # Save reports
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+    timings.to_csv(output_path / timing_filename, index=False)
+
+    return orig_out, perf_out, ctx.scores, report, timings
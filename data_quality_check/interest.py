@@ -2,6 +2,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
 from typing import Dict
+from src.loan_panel import LoanPanel
+from src.loan_indicators import rate_modification_indicators
 
 
 def analyze_rate_modification_consistency(
@@ -15,21 +17,16 @@ def analyze_rate_modification_consistency(
 ) -> Dict[str, int]:
    
 
-    df = df.copy()
+    # Rows grouped by loan once (file order kept within a loan)
+    lp = LoanPanel(df, id_col, date_col=None)
 
-    # Identify interest rate changes 
-    df["prev_rate"] = df.groupby(id_col)[rate_col].shift()
-    df["changed_seq"] = df["prev_rate"].notna() & (df[rate_col] != df["prev_rate"])
-    n_varying_rates = int(df.groupby(id_col)["changed_seq"].any().sum())
-
-    # Identify modified loans
-    mod_per_loan = df.groupby(id_col)[mod_col].apply(lambda x: (x == "Y").any())
-    n_modified_loans = int(mod_per_loan.sum())
+    # Identify interest rate changes and modified loans
+    flags = rate_modification_indicators(lp, rate_col, mod_col)
+    n_varying_rates = int(flags["rate_changed"].sum())
+    n_modified_loans = int(flags["modified"].sum())
 
     #Loans with both modifications and varying rates
-    loans_with_both = df.groupby(id_col)["changed_seq"].any()
-    loans_with_both = loans_with_both[loans_with_both.index.isin(mod_per_loan[mod_per_loan].index)]
-    n_both = int(loans_with_both.sum())
+    n_both = int((flags["rate_changed"] & flags["modified"]).sum())
 
 
 
@@ -9,30 +9,62 @@ from pathlib import Path
 BLUE, GREY, PURPLE = "#2f3b69", "#9f9f9f", "#c197d2"
 
 
-def _safe_std(x: pd.Series) -> float:
-    return float(np.nanstd(x.to_numpy(), ddof=1)) if x.size > 1 else 0.0
+def outlier_stats(x: np.ndarray, z_thr: float = 3.0, mz_thr: float = 3.5) -> dict:
 
-def _mad(x: pd.Series) -> float:
-    x = x.dropna()
-    if x.empty:
-        return np.nan
+    # IQR fences and the IQR / Z / modified-Z outlier shares of one column's non-missing values,
+    # plus the median the boxplot reuses
+    n = len(x)
+    q1, q3 = np.quantile(x, [0.25, 0.75])
     med = np.median(x)
-    return np.median(np.abs(x - med))
 
+    # IQR
+    iqr = q3 - q1
+    lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    iqr_pct = 100.0 * ((x < lower) | (x > upper)).sum() / n
 
-def _modified_z_scores(x: pd.Series) -> np.ndarray:
-    arr = x.to_numpy(dtype=float)
-    mask = ~np.isnan(arr)
-    out = np.full_like(arr, np.nan)
-    if mask.sum() == 0:
-        return out
-    med = np.nanmedian(arr)
-    mad = _mad(pd.Series(arr[mask]))
-    if mad == 0 or np.isnan(mad):
-        out[mask] = 0.0
-        return out
-    out[mask] = 0.6745 * (arr[mask] - med) / mad
-    return out
+    # Classical Z 
+    sd = float(np.std(x, ddof=1)) if n > 1 else 0.0
+    z_pct = 100.0 * ((np.abs((x - x.mean()) / sd) > z_thr).sum() / n) if sd > 0 else 0.0
+
+    # Modified Z 
+    mad = np.median(np.abs(x - med))
+    mz_pct = 100.0 * (np.abs(0.6745 * (x - med) / mad) > mz_thr).sum() / n if mad > 0 else 0.0
+
+    return {
+        "Q1": q1, "Q3": q3, "IQR": iqr,
+        "IQR_lower": lower, "IQR_upper": upper,
+        "IQR_outliers_%": iqr_pct,
+        "Z_outliers_%": z_pct,
+        "MZ_outliers_%": mz_pct,
+        "median": med,
+    }
+
+
+def outlier_score(report: pd.DataFrame) -> float:
+    valid_iqr = report["IQR_outliers_%"].dropna()
+    sum_iqr = valid_iqr.sum() if not valid_iqr.empty else np.nan
+    return round(1 - sum_iqr / 100, 3) if pd.notna(sum_iqr) else np.nan
+
+
+def _box_stats(x: np.ndarray, q1: float, med: float, q3: float,
+               max_fliers: int, rng: np.random.Generator) -> dict:
+
+    # Box statistics as ax.boxplot derives them (whiskers at the most extreme values within
+    # 1.5 IQR), from quantiles already computed; at most max_fliers fliers are kept, a random
+    # sample that always includes the two extremes
+    iqr = q3 - q1
+    inside = x[(x >= q1 - 1.5 * iqr) & (x <= q3 + 1.5 * iqr)]
+    whislo = min(inside.min(), q1) if inside.size else q1
+    whishi = max(inside.max(), q3) if inside.size else q3
+
+    fliers = x[(x < whislo) | (x > whishi)]
+    if fliers.size > max_fliers:
+        extremes = [fliers.argmin(), fliers.argmax()]
+        picked = rng.choice(fliers.size, size=max_fliers - 2, replace=False)
+        fliers = fliers[np.unique(np.concatenate([extremes, picked]))]
+
+    return {"med": med, "q1": q1, "q3": q3,
+            "whislo": whislo, "whishi": whishi, "fliers": fliers}
 
 
 def outlier_report(
@@ -40,6 +72,7 @@ def outlier_report(
     cols: list[str],
     z_thr: float = 3.0,
     mz_thr: float = 3.5,
+    max_fliers: int = 2000,
     output_dir: str = "Outputs/reports/Quality_Results",   
     filename: str = "outlier_report.png"
 ) -> pd.DataFrame:
@@ -48,6 +81,7 @@ def outlier_report(
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
+    rng = np.random.default_rng(0)
     for c in cols:
         s = pd.to_numeric(df[c], errors="coerce")
         n = s.notna().sum()
@@ -60,38 +94,21 @@ def outlier_report(
             })
             continue
 
-        # IQR
-        q1, q3 = s.quantile(0.25), s.quantile(0.75)
-        iqr = q3 - q1
-        lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-        iqr_mask = (s < lower) | (s > upper)
-        iqr_pct = 100.0 * iqr_mask.sum() / n
-
-        # Classical Z 
-        mu, sd = s.mean(), _safe_std(s)
-        z_pct = 100.0 * ((np.abs((s - mu) / sd) > z_thr).sum() / n) if sd > 0 else 0.0
-
-        # Modified Z 
-        mz = _modified_z_scores(s)
-        mz_pct = 100.0 * np.nansum(np.abs(mz) > mz_thr) / n
-
-        rows.append({
-            "column": c,
-            "Q1": q1, "Q3": q3, "IQR": iqr,
-            "IQR_lower": lower, "IQR_upper": upper,
-            "IQR_outliers_%": iqr_pct,
-            "Z_outliers_%": z_pct,
-            "MZ_outliers_%": mz_pct,
-        })
-
-        # Boxplots
+        # Quantiles and moments once per column; the boxplot reuses them
+        x = s.to_numpy(dtype=float)
+        x = x[~np.isnan(x)]
+        stats = outlier_stats(x, z_thr, mz_thr)
+        med = stats.pop("median")
+        rows.append({"column": c, **stats})
+
+        # Boxplots from the summary statistics, with a capped sample of fliers
         fig, ax = plt.subplots(figsize=(6, 4))
-        box = ax.boxplot(s.dropna(), patch_artist=True,
-                         boxprops=dict(facecolor=PURPLE, color=BLUE),
-                         whiskerprops=dict(color=GREY),
-                         capprops=dict(color=GREY),
-                         medianprops=dict(color=BLUE, linewidth=2),
-                         flierprops=dict(marker='o', color=BLUE, alpha=0.4))
+        ax.bxp([_box_stats(x, stats["Q1"], med, stats["Q3"], max_fliers, rng)], patch_artist=True,
+               boxprops=dict(facecolor=PURPLE, color=BLUE),
+               whiskerprops=dict(color=GREY),
+               capprops=dict(color=GREY),
+               medianprops=dict(color=BLUE, linewidth=2),
+               flierprops=dict(marker='o', color=BLUE, alpha=0.4))
         ax.set_title(f"Boxplot of {c}", fontsize=12, color=BLUE)
         ax.set_ylabel(c, color=GREY)
         plt.grid(True, linestyle="--", alpha=0.3)
@@ -119,9 +136,4 @@ def outlier_report(
 
    
     # Compute score 
-    valid_iqr = report["IQR_outliers_%"].dropna()
-    sum_iqr = valid_iqr.sum() if not valid_iqr.empty else np.nan
-    outlier_score = round(1 - sum_iqr / 100, 3) if pd.notna(sum_iqr) else np.nan
-
-
-    return report, outlier_score
+    return report, outlier_score(report)
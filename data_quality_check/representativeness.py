@@ -7,6 +7,104 @@ import matplotlib.pyplot as plt
 from pandas.api.types import is_categorical_dtype
 
 
+_PLACEHOLDERS = ["not_applicable", "not_modified"]
+
+
+def _category_shares_fast(s: pd.Series, include_na: bool):
+
+    # Level counts of a categorical from its codes with bincount. Gives the same figures as
+    # the string value_counts below: a missing value is the "nan" level (what astype(str)
+    # turns it into) and placeholder levels count as missing.
+    labels = np.append("nan", s.cat.categories.astype(str).to_numpy(dtype=object))
+    counts = np.bincount(s.cat.codes.to_numpy() + 1, minlength=len(labels))
+    counts = pd.Series(counts, index=labels).groupby(level=0, sort=False).sum()
+
+    placeholder = counts.index.isin(_PLACEHOLDERS)
+    n_missing = int(counts[placeholder].sum())
+    counts = counts[~placeholder & (counts > 0)]
+    if include_na and n_missing:
+        counts = pd.concat([counts, pd.Series([n_missing], index=[np.nan])])
+
+    total = counts.sum()
+    if total == 0:
+        return 0, np.nan, np.nan
+    top = np.argmax(counts.to_numpy())
+    return len(counts), counts.index[top], float(counts.iloc[top] / total * 100)
+
+
+def _capped_nunique(v: np.ndarray, cap: int) -> int:
+
+    # min(cap, number of distinct values), from a prefix when that already reaches the cap
+    if len(pd.unique(v[:100_000])) >= cap:
+        return cap
+    return min(cap, len(pd.unique(v)))
+
+
+def _quantile_positions(n: int, quantiles: np.ndarray):
+
+    # Order statistics and weights of linear-interpolated quantiles, as Series.quantile
+    # (np.percentile) computes them
+    virtual = (n - 1) * np.true_divide(quantiles * 100.0, 100)
+    prev = np.floor(virtual).astype(np.int64)
+    nxt = prev + 1
+    above = virtual >= n - 1
+    prev[above] = nxt[above] = n - 1
+    return prev, nxt, virtual - prev
+
+
+def _lerp(a, b, t):
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def _lowest_bin_qcut(s: pd.Series, q: int) -> float:
+    binned = pd.qcut(s, q=q, duplicates="drop")
+    bin_counts = binned.value_counts(normalize=True, dropna=True).sort_index() * 100
+    return float(bin_counts.min()) if not bin_counts.empty else np.nan
+
+
+def _lowest_bin_fast(v: np.ndarray, q: int, n_fine: int = 4096) -> float:
+
+    # Lowest qcut bin share without sorting: values are counted into n_fine equal-width bins,
+    # the order statistics behind the decile edges are read from the few fine bins that hold
+    # them, and bin counts come from the fine-bin totals. Matches pd.qcut(duplicates="drop").
+    n = len(v)
+    lo, hi = v.min(), v.max()
+    if not np.isfinite([lo, hi]).all():
+        return _lowest_bin_qcut(pd.Series(v), q)
+    if lo == hi:
+        raise ValueError("Bin edges must be unique.")
+    fine = np.minimum(((v - lo) * (n_fine / (hi - lo))).astype(np.int64), n_fine - 1)
+    cum = np.cumsum(np.bincount(fine, minlength=n_fine))
+    before = np.concatenate([[0], cum[:-1]])
+
+    prev, nxt, gamma = _quantile_positions(n, np.linspace(0, 1, q + 1))
+    ranks = np.concatenate([prev, nxt])
+    bins = np.unique(np.searchsorted(cum, ranks, side="right"))
+
+    # Values of the selected fine bins, sorted (fine bins are monotone in value)
+    sub = np.sort(v[np.isin(fine, bins)])
+    start = np.concatenate([[0], np.cumsum(cum[bins] - before[bins])])[:-1]
+
+    def order_stat(r):
+        b = np.searchsorted(cum, r, side="right")
+        return sub[start[np.searchsorted(bins, b)] + r - before[b]]
+
+    edges = np.unique(_lerp(order_stat(prev), order_stat(nxt), gamma))
+    if len(edges) < 2:
+        raise ValueError("Bin edges must be unique.")
+
+    # Count of values <= each edge: the fine bins below it, plus its own fine bin when selected
+    eb = np.minimum(((edges - lo) * (n_fine / (hi - lo))).astype(np.int64), n_fine - 1)
+    le = before[eb].copy()
+    own = np.isin(eb, bins)
+    pos = np.searchsorted(bins, eb[own])
+    le[own] += np.searchsorted(sub, edges[own], side="right") - start[pos]
+
+    counts = np.diff(np.concatenate([[0], le[1:]]))
+    return float((counts / n * 100).min())
+
+
 def check_representativeness(
     df: pd.DataFrame,
     *,
@@ -17,10 +115,13 @@ def check_representativeness(
     #low_bin_threshold: float = 0.05,
     n_bins: int = 10,
     include_na_in_shares: bool = False,
+    fast: bool = False,
     output_dir: str = "Outputs/reports/Quality_Results",
     image_name: str = "representativeness_report.png",
 ) -> dict[str, pd.DataFrame]:
-   
+    # fast=True counts categoricals from their codes and takes decile edges from an
+    # equal-width histogram refined on the fine bins holding them (no sort, no string copies);
+    # the reported shares are the same as the default path (tolerance 0 after rounding)
     records: list[Dict[str, Any]] = []
 
     # CATEGORICAL
@@ -28,11 +129,25 @@ def check_representativeness(
         if col not in df.columns:
             continue
 
+        if fast and is_categorical_dtype(df[col]):
+            try:
+                n_levels, top_cat, top_share = _category_shares_fast(df[col], include_na_in_shares)
+            except Exception:
+                n_levels, top_cat, top_share = np.nan, np.nan, np.nan
+            records.append({
+                "column": col,
+                "type": "categorical",
+                "n_levels": int(n_levels) if pd.notna(n_levels) else np.nan,
+                "top_category": top_cat,
+                "top_share_%": round(top_share, 2) if pd.notna(top_share) else np.nan
+            })
+            continue
+
         # Exclude placeholder values that are not real categories
         if is_categorical_dtype(df[col]):
-          s = df[col].astype(str).replace(["not_applicable", "not_modified"], np.nan)
+          s = df[col].astype(str).replace(_PLACEHOLDERS, np.nan)
         else:
-          s = df[col].replace(["not_applicable", "not_modified"], np.nan)
+          s = df[col].replace(_PLACEHOLDERS, np.nan)
 
         try:
             vc = s.value_counts(normalize=True, dropna=not include_na_in_shares) * 100
@@ -97,17 +212,19 @@ def check_representativeness(
             })
             continue
 
+        n_unique = _capped_nunique(s.to_numpy(), n_bins) if fast else s.nunique()
         try:
-            binned = pd.qcut(s, q=min(n_bins, max(2, s.nunique())), duplicates="drop")
-            bin_counts = binned.value_counts(normalize=True, dropna=True).sort_index() * 100
-            lowest_bin = float(bin_counts.min()) if not bin_counts.empty else np.nan
+            if fast:
+                lowest_bin = _lowest_bin_fast(s.to_numpy(dtype="float64"), min(n_bins, max(2, n_unique)))
+            else:
+                lowest_bin = _lowest_bin_qcut(s, min(n_bins, max(2, n_unique)))
         except Exception:
             lowest_bin = np.nan
 
         records.append({
             "column": col,
             "type": "numeric",
-            "bins": int(min(n_bins, s.nunique())),
+            "bins": int(min(n_bins, n_unique)),
             "lowest_bin_%": round(lowest_bin, 2) if pd.notna(lowest_bin) else np.nan
         })
 
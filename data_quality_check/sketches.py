@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+
+def hash_rows(frame) -> np.ndarray:
+
+    # 64-bit hash per row (Series or DataFrame); missing values hash equal to each other, and
+    # categorical columns hash like their values, so chunks read with different dtypes agree
+    if isinstance(frame, pd.Series):
+        frame = frame.to_frame()
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+
+    # Mergeable distinct-count estimate over 64-bit hashes, 2**p registers.
+    # Relative standard error 1.04 / sqrt(2**p) (p=14: 0.81%, p=16: 0.41%).
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def add_hashes(self, h: np.ndarray) -> "HyperLogLog":
+
+        if len(h) == 0:
+            return self
+        p = self.p
+        idx = (h >> np.uint64(64 - p)).astype(np.int64)
+        w = h & np.uint64((1 << (64 - p)) - 1)
+
+        # rank = leading zeros of the remaining 64 - p bits, plus one
+        top = np.floor(np.log2(np.maximum(w, 1).astype("float64"))).astype(np.int64)
+        top -= (np.left_shift(np.uint64(1), top.astype(np.uint64)) > w) & (w > 0)
+        rank = np.where(w == 0, 64 - p + 1, (64 - p) - top).astype(np.uint8)
+
+        np.maximum.at(self.registers, idx, rank)
+        return self
+
+    def add(self, frame) -> "HyperLogLog":
+        return self.add_hashes(hash_rows(frame))
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def union(self, other: "HyperLogLog") -> "HyperLogLog":
+        out = HyperLogLog(self.p)
+        out.registers = np.maximum(self.registers, other.registers)
+        return out
+
+    def count(self) -> float:
+
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+
+        # Small range: linear counting while there are empty registers
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+
+class KLLSketch:
+
+    # Mergeable quantile sketch (Karnin-Lang-Liberty compactors): level h holds items of weight
+    # 2**h; a full level is sorted and every other item (random offset) moves one level up.
+    # Normalized rank error about 2.296 / k**0.9723 with 99% confidence (k=1000: ~0.28%).
+
+    def __init__(self, k: int = 1000, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self) -> float:
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - 1 - h
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self) -> None:
+
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                keep = level[:1] if len(level) % 2 else level[:0]
+                level = level[len(keep):]
+                promoted = level[self._rng.integers(0, 2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                h = 0 if len(self.levels[h + 1]) <= self._capacity(h + 1) else h + 1
+                continue
+            h += 1
+
+    def update(self, values) -> "KLLSketch":
+        v = np.asarray(values, dtype="float64")
+        v = v[~np.isnan(v)]
+        if len(v):
+            self.n += len(v)
+            self.levels[0] = np.concatenate([self.levels[0], v])
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self) -> tuple[np.ndarray, np.ndarray]:
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q) -> np.ndarray:
+        items, cum = self._weighted()
+        if len(items) == 0:
+            return np.full(np.shape(q), np.nan)
+        pos = np.searchsorted(cum, np.asarray(q) * cum[-1], side="left")
+        return items[np.minimum(pos, len(items) - 1)]
+
+    def fraction_below(self, t, inclusive: bool = False) -> np.ndarray:
+
+        # Estimated share of values < t (<= t when inclusive)
+        items, cum = self._weighted()
+        if len(items) == 0:
+            return np.full(np.shape(t), np.nan)
+        pos = np.searchsorted(items, t, side="right" if inclusive else "left")
+        return np.where(pos > 0, np.concatenate([[0.0], cum])[pos], 0.0) / cum[-1]
+
+    def fraction_outside(self, lower, upper) -> float:
+        return float(self.fraction_below(lower) + 1 - self.fraction_below(upper, inclusive=True))
+
+    def median_abs_deviation(self, center: float) -> float:
+
+        # Smallest d with at least half the weight inside [center - d, center + d]
+        items, cum = self._weighted()
+        if len(items) == 0:
+            return np.nan
+        total = np.concatenate([[0.0], cum])
+        d = np.unique(np.abs(items - center))
+        inside = total[np.searchsorted(items, center + d, side="right")] - total[np.searchsorted(items, center - d, side="left")]
+        return float(d[np.searchsorted(inside, 0.5 * cum[-1], side="left").clip(max=len(d) - 1)])
+
+
+class Moments:
+
+    # Count, mean and sum of squared deviations, merged exactly (Chan et al.)
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def update(self, values) -> "Moments":
+        v = np.asarray(values, dtype="float64")
+        v = v[~np.isnan(v)]
+        if len(v):
+            other = Moments()
+            other.n, other.mean = len(v), float(v.mean())
+            other.m2 = float(((v - other.mean) ** 2).sum())
+            self.merge(other)
+        return self
+
+    def merge(self, other: "Moments") -> "Moments":
+        n = self.n + other.n
+        if n:
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.n * other.n / n
+            self.mean += delta * other.n / n
+            self.n = n
+        return self
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else 0.0
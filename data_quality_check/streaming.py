@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from src.format_variables_mortgages import datetime_to_month_index
+from data_quality_check.sketches import HyperLogLog, KLLSketch, Moments
+
+
+# Streaming data-quality mode: each chunk (a Parquet row group or a slice of a DataFrame) is
+# folded into a StreamState, states from different workers are merged, and the completeness,
+# uniqueness and outlier scores are read off the merged state.
+#
+# Error bounds (reported next to every approximate metric):
+#   - null counts, row counts, Type 2 gaps and cutoff loans are exact (gaps assume each
+#     (loan, month) appears once, which the uniqueness check reports on)
+#   - duplicates = rows - HyperLogLog distinct keys; +/- 2 * 1.04 / sqrt(2**p) * distinct (~95%)
+#   - ID reconciliation from HyperLogLog unions of the loan IDs, same relative error on each count
+#   - outlier shares from KLL sketches; each tail is within the rank error eps of its value at
+#     the sketch's fences (99%), so a percentage is within +/- 200 * eps points; Z bounds use
+#     exact mean and std, IQR and MAD fences come from quantiles within eps in rank
+
+
+class StreamState:
+
+    def __init__(self, *, id_col, date_col, id_cols_orig=None, id_cols_perf=None, outlier_cols=None,
+                 hll_precision=18, kll_k=1000, seed=0):
+
+        self.id_col, self.date_col = id_col, date_col
+        self.id_cols = {"orig": id_cols_orig, "perf": id_cols_perf}
+        self.outlier_cols = outlier_cols or []
+
+        self.rows = {"orig": 0, "perf": 0}
+        self.nulls = {"orig": {}, "perf": {}}
+        self.keys = {kind: HyperLogLog(hll_precision) for kind in ("orig", "perf")}
+        self.ids = {kind: HyperLogLog(hll_precision) for kind in ("orig", "perf")}
+        self.quantiles = {c: KLLSketch(kll_k, seed=seed) for c in self.outlier_cols}
+        self.moments = {c: Moments() for c in self.outlier_cols}
+
+        # First month, last month and month count per loan (perf); partial tables are combined
+        # lazily so memory follows the number of loans, not rows
+        self._spans = []
+        self._span_rows = 0
+
+    def update(self, kind: str, chunk: pd.DataFrame) -> "StreamState":
+
+        self.rows[kind] += len(chunk)
+        nulls = self.nulls[kind]
+        for c, n in chunk.isna().sum().items():
+            nulls[c] = nulls.get(c, 0) + int(n)
+
+        keys = self.id_cols[kind]
+        self.keys[kind].add(chunk[list(keys)] if keys else chunk)
+        if self.id_col in chunk.columns:
+            ids = chunk[self.id_col]
+            self.ids[kind].add(ids[ids.notna()])
+
+        if kind == "perf":
+            if self.id_col in chunk.columns and self.date_col in chunk.columns:
+                self._update_spans(chunk)
+            for c in self.outlier_cols:
+                s = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype="float64")
+                self.quantiles[c].update(s)
+                self.moments[c].update(s)
+        return self
+
+    def _update_spans(self, chunk: pd.DataFrame) -> None:
+
+        dates = chunk[self.date_col]
+        months = datetime_to_month_index(dates if dates.dtype.kind == "M" else pd.to_datetime(dates, errors="coerce"))
+        frame = pd.DataFrame({"id": chunk[self.id_col].to_numpy(), "month": months})
+        frame = frame[~np.isnan(months)].drop_duplicates()
+        span = frame.groupby("id", sort=False, dropna=False)["month"].agg(["min", "max", "count"])
+        self._add_spans(span)
+
+    def _add_spans(self, span: pd.DataFrame) -> None:
+        self._spans.append(span)
+        self._span_rows += len(span)
+        if len(self._spans) > 1 and self._span_rows > 2 * max(len(self._spans[0]), 100_000):
+            self.spans()
+
+    def spans(self) -> pd.DataFrame:
+
+        if not self._spans:
+            return pd.DataFrame({"min": [], "max": [], "count": []})
+        if len(self._spans) > 1:
+            span = pd.concat(self._spans).groupby(level=0, sort=False, dropna=False).agg(
+                {"min": "min", "max": "max", "count": "sum"})
+            self._spans = [span]
+            self._span_rows = len(span)
+        return self._spans[0]
+
+    def merge(self, other: "StreamState") -> "StreamState":
+
+        for kind in ("orig", "perf"):
+            self.rows[kind] += other.rows[kind]
+            for c, n in other.nulls[kind].items():
+                self.nulls[kind][c] = self.nulls[kind].get(c, 0) + n
+            self.keys[kind].merge(other.keys[kind])
+            self.ids[kind].merge(other.ids[kind])
+        for c in self.outlier_cols:
+            self.quantiles[c].merge(other.quantiles[c])
+            self.moments[c].merge(other.moments[c])
+        for span in other._spans:
+            self._add_spans(span)
+        return self
+
+
+def _parquet_files(source) -> list:
+    path = Path(source)
+    return sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+
+
+def _chunk_tasks(source, kind: str) -> list:
+
+    # (kind, file, row group) per Parquet row group; DataFrames are sliced in-process
+    tasks = []
+    for path in _parquet_files(source):
+        for rg in range(pq.ParquetFile(path).metadata.num_row_groups):
+            tasks.append((kind, str(path), rg))
+    return tasks
+
+
+def _sketch_row_groups(tasks, spec: dict, batch_rows: int, seed: int) -> StreamState:
+
+    state = StreamState(**spec, seed=seed)
+    for kind, path, rg in tasks:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, row_groups=[rg]):
+            state.update(kind, batch.to_pandas())
+    return state
+
+
+def _sketch_frame(df: pd.DataFrame, kind: str, state: StreamState, batch_rows: int) -> None:
+    for start in range(0, len(df), batch_rows):
+        state.update(kind, df.iloc[start:start + batch_rows])
+
+
+def stream_quality_scores(
+    orig,
+    perf,
+    *,
+    id_col: str = "LoanSequenceNumber",
+    date_col: str = "MonthlyReportingPeriod",
+    id_cols_orig=None,
+    id_cols_perf=None,
+    outlier_cols=None,
+    first_period_after_year=2011,
+    exclude_cols=None,
+    z_thr: float = 3.0,
+    mz_thr: float = 3.5,
+    batch_rows: int = 1_000_000,
+    max_workers=None,
+    hll_precision: int = 18,
+    kll_k: int = 1000,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "quality_stream_report.csv",
+):
+    # Completeness, uniqueness and outlier scores in one pass over orig and perf, each a
+    # DataFrame, a Parquet file or a directory of Parquet files (e.g. a lake partition).
+    # Parquet row groups are sketched by worker processes (max_workers=1 stays in-process).
+    # Every score is computed on the tables as given; unlike the engine, loans dropped by
+    # completeness are not removed before uniqueness and outliers. Returns (scores, report),
+    # the report holding each metric with its error bound (NaN where exact).
+    exclude_cols = exclude_cols or []
+    spec = dict(id_col=id_col, date_col=date_col, id_cols_orig=id_cols_orig, id_cols_perf=id_cols_perf,
+                outlier_cols=outlier_cols, hll_precision=hll_precision, kll_k=kll_k)
+
+    state = StreamState(**spec)
+    tasks = []
+    for kind, source in (("orig", orig), ("perf", perf)):
+        if isinstance(source, pd.DataFrame):
+            _sketch_frame(source, kind, state, batch_rows)
+        else:
+            tasks += _chunk_tasks(source, kind)
+
+    if tasks:
+        if max_workers == 1:
+            state.merge(_sketch_row_groups(tasks, spec, batch_rows, seed=1))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(_sketch_row_groups, [task], spec, batch_rows, i + 1)
+                           for i, task in enumerate(tasks)]
+                for f in futures:
+                    state.merge(f.result())
+
+    rows, scores = [], {}
+
+    def add(check, metric, value, bound=np.nan):
+        rows.append({"check": check, "metric": metric, "value": value, "error_bound": bound})
+
+    # Completeness (exact)
+    missing, total_cells = 0, 0
+    for kind in ("orig", "perf"):
+        cols = [c for c in state.nulls[kind] if c not in exclude_cols]
+        missing += sum(state.nulls[kind][c] for c in cols)
+        total_cells += state.rows[kind] * len(cols)
+
+    span = state.spans()
+    span = span[span.index.notna()]
+    loan_gaps = (span["max"] - span["min"] + 1 - span["count"]).clip(lower=0)
+    total_gaps = int(loan_gaps.sum())
+    with_gaps = int((loan_gaps > 0).sum())
+    after_cutoff = (int((span["min"] // 12 > int(first_period_after_year)).sum())
+                    if first_period_after_year is not None else 0)
+
+    gap_cells = total_gaps * max(len(state.nulls["perf"]) - len(exclude_cols), 0)
+    expected_cells = total_cells + gap_cells
+    completeness = 1.0 - ((missing + gap_cells) / expected_cells if expected_cells > 0 else 0.0)
+    scores["Completeness"] = round(float(completeness), 6)
+
+    add("completeness", "Total Cells", int(expected_cells))
+    add("completeness", "Type 1 missing values", int(missing))
+    add("completeness", "Type 2 gap months", total_gaps)
+    add("completeness", "Type 2 gap cells", int(gap_cells))
+    add("completeness", "Loans_with_Gaps", with_gaps)
+    add("completeness", "Loans_FirstPeriod_After_Cutoff", after_cutoff)
+    add("completeness", "Completeness_Score", scores["Completeness"])
+
+    # Uniqueness (HyperLogLog)
+    z = 2 * state.keys["orig"].relative_error
+    distinct = {kind: state.keys[kind].count() for kind in ("orig", "perf")}
+    dups = {kind: max(state.rows[kind] - distinct[kind], 0.0) for kind in ("orig", "perf")}
+    total_records = state.rows["orig"] + state.rows["perf"]
+    uniqueness = 1 - (dups["orig"] + dups["perf"]) / total_records if total_records else 0.0
+    scores["Uniqueness"] = round(uniqueness, 6)
+
+    add("uniqueness", "duplicates_df1", round(dups["orig"]), z * distinct["orig"])
+    add("uniqueness", "duplicates_df2", round(dups["perf"]), z * distinct["perf"])
+    add("uniqueness", "Uniqueness_Score", scores["Uniqueness"],
+        z * (distinct["orig"] + distinct["perf"]) / total_records if total_records else np.nan)
+
+    n_orig, n_perf = state.ids["orig"].count(), state.ids["perf"].count()
+    n_union = state.ids["orig"].union(state.ids["perf"]).count()
+    add("consistency", "ID_Difference_Count", round(max(2 * n_union - n_orig - n_perf, 0.0)),
+        z * (2 * n_union + n_orig + n_perf))
+
+    # Outliers (KLL quantiles, exact moments)
+    sum_iqr, any_valid, sum_bound = 0.0, False, 0.0
+    for c in state.outlier_cols:
+        sketch, mom = state.quantiles[c], state.moments[c]
+        if sketch.n == 0:
+            for m in ("IQR", "Z", "MZ"):
+                add("outliers", f"{c}_{m}_outliers_%", np.nan)
+            continue
+        bound = 200.0 * sketch.rank_error
+
+        q1, q3 = sketch.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        iqr_pct = 100.0 * sketch.fraction_outside(q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+
+        sd = mom.std
+        z_pct = 100.0 * sketch.fraction_outside(mom.mean - z_thr * sd, mom.mean + z_thr * sd) if sd > 0 else 0.0
+
+        med = float(sketch.quantile(0.5))
+        mad = sketch.median_abs_deviation(med)
+        reach = mz_thr * mad / 0.6745
+        mz_pct = 100.0 * sketch.fraction_outside(med - reach, med + reach) if mad > 0 else 0.0
+
+        add("outliers", f"{c}_IQR_outliers_%", iqr_pct, bound)
+        add("outliers", f"{c}_Z_outliers_%", z_pct, bound)
+        add("outliers", f"{c}_MZ_outliers_%", mz_pct, bound)
+        sum_iqr += iqr_pct
+        sum_bound += bound
+        any_valid = True
+
+    scores["Outliers"] = round(1 - sum_iqr / 100, 3) if any_valid else np.nan
+    add("outliers", "Outlier_Score", scores["Outliers"], sum_bound / 100 if any_valid else np.nan)
+
+    report = pd.DataFrame(rows, columns=["check", "metric", "value", "error_bound"])
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
+    return scores, report
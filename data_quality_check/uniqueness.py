@@ -1,18 +1,32 @@
+import tempfile
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+from pandas.api.types import is_datetime64_any_dtype
+from src.loan_panel import LoanPanel
+from data_quality_check.sketches import hash_rows
 
 
-def uniqueness_score(
+def duplicate_counts(
     df1: pd.DataFrame,
     df2: Optional[pd.DataFrame] = None,
     id_cols_df1: Optional[List[str]] = None,
     id_cols_df2: Optional[List[str]] = None,
-    output_dir: str = "Outputs/reports/Quality_Results",
-    filename: str = "uniqueness_report.csv",
-) -> float:
-    
+    *,
+    lp: Optional[LoanPanel] = None,
+    keep: Optional[np.ndarray] = None,
+) -> Tuple[Dict[str, int], int]:
+
+    # Duplicate counts of uniqueness_score and the number of evaluated records. lp: df2 as a
+    # loan-month panel, where (loan, month) duplicates are adjacent; keep: per-loan mask of lp
+    # codes still in scope (last entry: missing IDs), rows of other loans are skipped
     results: Dict[str, int] = {}
+    row_keep = None
+    if lp is not None and keep is not None:
+        row_keep = keep[lp.codes]
+        df1 = df1[keep[lp.codes_of(df1[lp.id_col])]]
 
 
     #Duplicates in df1
@@ -24,15 +38,38 @@ def uniqueness_score(
 
 
     # Duplicates in df2 (if provided)
+    n_df2 = 0
     if df2 is not None:
-        if id_cols_df2:
-            d2_dupes = df2.duplicated(subset=id_cols_df2).sum()
+        if lp is not None and lp.date_col is not None and list(id_cols_df2 or []) == [lp.id_col, lp.date_col]:
+            key = lp.key if row_keep is None else lp.key[row_keep]
+            d2_dupes = (key[1:] == key[:-1]).sum()
+            n_df2 = len(key)
         else:
-            d2_dupes = df2.duplicated().sum()
+            if row_keep is not None:
+                df2 = df2[lp.to_input_order(row_keep)]
+            if id_cols_df2:
+                d2_dupes = df2.duplicated(subset=id_cols_df2).sum()
+            else:
+                d2_dupes = df2.duplicated().sum()
+            n_df2 = len(df2)
         results["duplicates_df2"] = int(d2_dupes)
     else:
         results["duplicates_df2"] = 0
 
+    return results, len(df1) + n_df2
+
+
+def uniqueness_score(
+    df1: pd.DataFrame,
+    df2: Optional[pd.DataFrame] = None,
+    id_cols_df1: Optional[List[str]] = None,
+    id_cols_df2: Optional[List[str]] = None,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "uniqueness_report.csv",
+) -> float:
+    
+    results, total_records = duplicate_counts(df1, df2, id_cols_df1, id_cols_df2)
+
 
     # Total duplicates across both datasets
     total_duplicates = (
@@ -41,7 +78,6 @@ def uniqueness_score(
 
 
     # Total evaluated records
-    total_records = len(df1) + (len(df2) if df2 is not None else 0)
     if total_records == 0:
         return 0.0
 
@@ -59,3 +95,165 @@ def uniqueness_score(
 
     return round(score, 6)
 
+
+
+# Fingerprint entries spilled to disk: 64-bit key hash, source file number, row within the file
+_FP_DTYPE = np.dtype([("fp", "<u8"), ("file", "<u4"), ("row", "<u8")])
+
+
+def _key_fingerprints(batch: pd.DataFrame) -> np.ndarray:
+
+    # Dates are hashed at one resolution so files written with different units agree
+    dates = [c for c in batch.columns if is_datetime64_any_dtype(batch[c])]
+    if dates:
+        batch = batch.astype({c: "datetime64[ns]" for c in dates})
+    return hash_rows(batch)
+
+
+def _duplicate_sources(sources) -> list:
+    if isinstance(sources, (str, Path)):
+        path = Path(sources)
+        return sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+    return list(sources)
+
+
+def _iter_source(source, key_cols, batch_rows):
+    if isinstance(source, pd.DataFrame):
+        frame = source if key_cols is None else source[list(key_cols)]
+        for start in range(0, len(frame), batch_rows):
+            yield frame.iloc[start:start + batch_rows]
+    else:
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_rows, columns=key_cols):
+            yield batch.to_pandas()
+
+
+def _read_rows(source, key_cols, rows) -> pd.DataFrame:
+
+    # Rows in the requested order; of a Parquet file only the row groups holding them are read
+    rows = np.asarray(rows, dtype=np.int64)
+    if isinstance(source, pd.DataFrame):
+        frame = source if key_cols is None else source[list(key_cols)]
+        return frame.iloc[rows].reset_index(drop=True)
+
+    pf = pq.ParquetFile(source)
+    starts = np.cumsum([0] + [pf.metadata.row_group(g).num_rows for g in range(pf.num_row_groups)])
+    group = np.searchsorted(starts, rows, side="right") - 1
+    frames = []
+    for g in np.unique(group):
+        at = np.flatnonzero(group == g)
+        table = pf.read_row_group(int(g), columns=key_cols).take(rows[at] - starts[g])
+        frames.append(table.to_pandas().set_axis(at))
+    return pd.concat(frames).sort_index().reset_index(drop=True)
+
+
+def fingerprint_duplicates(
+    sources,
+    key_cols: Optional[List[str]] = None,
+    *,
+    n_partitions: int = 64,
+    max_buffer_rows: int = 5_000_000,
+    batch_rows: int = 1_000_000,
+    spill_dir=None,
+    sample_size: int = 5,
+    output_dir: str = "Outputs/reports/Quality_Results",
+    filename: str = "duplicate_fingerprints.csv",
+    examples_filename: str = "duplicate_examples.csv",
+):
+    # Duplicate rows (or key subsets) within and across files: a directory of Parquet files
+    # (e.g. a lake partition), a file, or a list of files / DataFrames. Keys are hashed to
+    # 64-bit fingerprints and bucketed into n_partitions by hash; buckets are spilled to disk
+    # once more than max_buffer_rows are buffered, then each bucket is sorted on its own, so
+    # memory stays near (rows / n_partitions + max_buffer_rows) * 20 bytes. Two distinct keys
+    # share a fingerprint with probability ~ rows**2 / 2**65.
+    #
+    # A row is a within-file duplicate when its key already occurred earlier in the same file,
+    # and a cross-file duplicate when it first occurred in an earlier file (in `sources` order).
+    # Returns (per-file report, example duplicate keys).
+    sources = _duplicate_sources(sources)
+    names = [str(s) if not isinstance(s, pd.DataFrame) else f"frame-{i}" for i, s in enumerate(sources)]
+    n_rows = np.zeros(len(sources), dtype=np.int64)
+
+    with tempfile.TemporaryDirectory(dir=spill_dir) as tmp:
+        buffers = [[] for _ in range(n_partitions)]
+        buffered = 0
+        spilled = np.zeros(n_partitions, dtype=bool)
+
+        def flush():
+            for p, chunks in enumerate(buffers):
+                if chunks:
+                    with open(Path(tmp) / f"part-{p:04d}.bin", "ab") as f:
+                        np.concatenate(chunks).tofile(f)
+                    spilled[p] = True
+                    chunks.clear()
+
+        # Pass 1: fingerprints, bucketed by hash
+        for file_no, source in enumerate(sources):
+            for batch in _iter_source(source, key_cols, batch_rows):
+                entries = np.empty(len(batch), dtype=_FP_DTYPE)
+                entries["fp"] = _key_fingerprints(batch)
+                entries["file"] = file_no
+                entries["row"] = np.arange(n_rows[file_no], n_rows[file_no] + len(batch))
+                n_rows[file_no] += len(batch)
+
+                part = entries["fp"] % np.uint64(n_partitions)
+                order = np.argsort(part, kind="stable")
+                bounds = np.searchsorted(part[order], np.arange(n_partitions + 1))
+                for p in np.flatnonzero(np.diff(bounds)):
+                    buffers[p].append(entries[order[bounds[p]:bounds[p + 1]]])
+                buffered += len(entries)
+                if buffered > max_buffer_rows:
+                    flush()
+                    buffered = 0
+
+        # Pass 2: one bucket at a time, sorted by (fingerprint, file, row)
+        within = np.zeros(len(sources), dtype=np.int64)
+        cross = np.zeros(len(sources), dtype=np.int64)
+        examples = {"within_file": [], "cross_file": []}
+        for p in range(n_partitions):
+            chunks = buffers[p]
+            if spilled[p]:
+                chunks = [np.fromfile(Path(tmp) / f"part-{p:04d}.bin", dtype=_FP_DTYPE)] + chunks
+            if not chunks:
+                continue
+            e = np.concatenate(chunks)
+            buffers[p] = []
+            e = e[np.lexsort((e["row"], e["file"], e["fp"]))]
+
+            new_key = np.ones(len(e), dtype=bool)
+            new_key[1:] = e["fp"][1:] != e["fp"][:-1]
+            new_in_file = new_key.copy()
+            new_in_file[1:] |= e["file"][1:] != e["file"][:-1]
+            first = e["file"][np.maximum.accumulate(np.where(new_key, np.arange(len(e)), 0))]
+
+            for kind, mask, counts in (("within_file", ~new_in_file, within),
+                                       ("cross_file", new_in_file & ~new_key, cross)):
+                counts += np.bincount(e["file"][mask], minlength=len(sources))
+                need = sample_size - len(examples[kind])
+                if need > 0 and mask.any():
+                    rows = np.flatnonzero(mask)[:need]
+                    examples[kind] += list(zip(e["file"][rows], e["row"][rows], first[rows]))
+
+    report = pd.DataFrame({
+        "file": names,
+        "rows": n_rows,
+        "within_file_duplicates": within,
+        "cross_file_duplicates": cross,
+    })
+
+    # Example keys, read back from their files (each file once)
+    frames = []
+    for kind, found in examples.items():
+        for file_no in sorted({f for f, _, _ in found}):
+            picked = [(row, first_file) for f, row, first_file in found if f == file_no]
+            keys = _read_rows(sources[file_no], key_cols, [int(row) for row, _ in picked])
+            frames.append(keys.assign(kind=kind, file=names[file_no], row=[int(r) for r, _ in picked],
+                                      first_file=[names[f] for _, f in picked]))
+    examples = (pd.concat(frames, ignore_index=True) if frames
+                else pd.DataFrame(columns=["kind", "file", "row", "first_file"]))
+
+    # Save reports
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    report.to_csv(Path(output_dir) / filename, index=False)
+    examples.to_csv(Path(output_dir) / examples_filename, index=False)
+
+    return report, examples
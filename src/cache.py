@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+# Bytes hashed from the head and the tail of each raw file
+SAMPLE_BYTES = 1 << 20
+
+
+def file_fingerprint(path, sample_bytes: int = SAMPLE_BYTES) -> dict:
+
+    # size + mtime catch normal rewrites, the sampled hash catches copies that keep the mtime
+    path = Path(path)
+    stat = path.stat()
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        digest.update(fh.read(sample_bytes))
+        if stat.st_size > 2 * sample_bytes:
+            fh.seek(-sample_bytes, os.SEEK_END)
+            digest.update(fh.read(sample_bytes))
+        elif stat.st_size > sample_bytes:
+            digest.update(fh.read())
+
+    return {
+        "name": path.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def cache_key(**parts) -> str:
+
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def read_manifest(path) -> dict:
+
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_manifest(path, key: str, **info) -> None:
+
+    # Written last and renamed into place, so a half-written cache never looks valid
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"key": key, **info}, indent=2, default=str))
+    tmp.replace(path)
@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from pandas.api.types import is_float_dtype, is_integer_dtype
+
+
+# Low-cardinality text columns stored as category
+CATEGORY_COLS = ["PropertyState", "PropertyType", "ZeroBalanceCode", "ModificationFlag"]
+
+# 0/1 flags
+FLAG_COLS = ["PPM_Flag", "InterestOnlyFlag", "PrepayType"]
+
+# Ratio columns that may be stored as float32; amounts (UPBs, losses) always stay float64
+FLOAT32_COLS = ["InterestRate", "CurrentInterestRate", "LTV", "CLTV", "EstimatedLTV", "DTI", "MI_Percent"]
+
+# Largest round-trip error accepted when downcasting one of those columns to float32
+FLOAT32_ATOL = 0.005
+
+
+def _fits_float32(values: np.ndarray, atol: float) -> bool:
+
+    ok = ~np.isnan(values)
+    if not ok.any():
+        return True
+    v = values[ok]
+    return bool(np.max(np.abs(v - v.astype(np.float32).astype(np.float64))) <= atol)
+
+
+def compact_panel(
+    merged: pd.DataFrame,
+    *,
+    id_col: str = "LoanSequenceNumber",
+    float_atol: float = FLOAT32_ATOL,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    panel = merged.copy(deep=False)
+
+    # Integer loan key (same column name) + lookup table back to the original IDs; a missing
+    # ID stays missing (nullable key), so groupbys still drop those rows
+    codes, ids = pd.factorize(panel[id_col], sort=True)
+    key_dtype = np.int32 if len(ids) < np.iinfo(np.int32).max else np.int64
+    keys = pd.Series(codes.astype(key_dtype), index=panel.index)
+    if (codes < 0).any():
+        keys = keys.astype("Int32" if key_dtype is np.int32 else "Int64").mask(codes < 0)
+    panel[id_col] = keys
+    loan_lookup = pd.DataFrame({"LoanKey": np.arange(len(ids), dtype=key_dtype), id_col: ids})
+
+    for col in panel.columns:
+        s = panel[col]
+        if col == id_col:
+            continue
+
+        if col in CATEGORY_COLS:
+            panel[col] = s.astype("category")
+
+        elif col in FLAG_COLS and is_integer_dtype(s):
+            panel[col] = s.astype("Int8") if s.isna().any() else s.astype(np.int8)
+
+        elif col == "LoanAge":
+            s = pd.to_numeric(s, errors="coerce")
+            panel[col] = s.astype("Int16") if s.isna().any() else s.astype(np.int16)
+
+        # float32 only for the ratio columns, and only when their values survive the round trip
+        elif col in FLOAT32_COLS and is_float_dtype(s) and _fits_float32(s.to_numpy(dtype="float64"), float_atol):
+            panel[col] = s.astype(np.float32)
+
+    return panel, loan_lookup
+
+
+def restore_loan_ids(panel: pd.DataFrame, loan_lookup: pd.DataFrame, *, id_col: str = "LoanSequenceNumber") -> pd.DataFrame:
+
+    panel = panel.copy(deep=False)
+    keys = panel[id_col]
+    missing = keys.isna().to_numpy()
+    ids = loan_lookup[id_col].to_numpy()
+    if missing.any():
+        ids = np.append(ids.astype(object), None)
+    panel[id_col] = ids[np.where(missing, len(ids) - 1, keys.to_numpy(dtype=np.int64, na_value=-1))]
+    return panel
+
+
+def memory_report(
+    before: pd.DataFrame,
+    after: pd.DataFrame,
+    *,
+    extra: dict | None = None,
+    output_dir: str = "Outputs/reports/data_analysis",
+    filename: str = "memory_report.csv",
+) -> pd.DataFrame:
+
+    # extra: side tables (e.g. the loan lookup) counted in the "after" total
+    bytes_before = before.memory_usage(deep=True, index=False)
+    bytes_after = after.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": bytes_before,
+        "dtype_after": after.dtypes.astype(str).reindex(before.columns),
+        "bytes_after": bytes_after.reindex(before.columns),
+    })
+    for name, table in (extra or {}).items():
+        report.loc[name] = ["", 0, "side table", int(table.memory_usage(deep=True, index=False).sum())]
+
+    report.loc["TOTAL"] = ["", int(report["bytes_before"].sum()), "", int(report["bytes_after"].sum())]
+    report["ratio"] = (report["bytes_after"] / report["bytes_before"].replace(0, np.nan)).round(3)
+    report.index.name = "column"
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename)
+
+    return report
@@ -1,55 +1,202 @@
+import time
 import pandas as pd
 import numpy as np
+from pathlib import Path
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
 
 
-def format_datasets(orig, perf):
+# Bump whenever the formatting below changes, so cached Parquet outputs are rebuilt
+FORMAT_VERSION = "2"
+
+# Months between year 0 and the numpy epoch (1970-01)
+_EPOCH_MONTH = 1970 * 12
+
+
+def yyyymm_to_month_index(values) -> np.ndarray:
+
+    # YYYYMM -> year * 12 + (month - 1) as float, NaN for missing or invalid months
+    v = pd.to_numeric(pd.Series(values, copy=False), errors="coerce").to_numpy(dtype="float64")
+    year, month = np.divmod(v, 100)
+    idx = year * 12 + (month - 1)
+    bad = (month < 1) | (month > 12) | (v != np.floor(v))
+    idx[bad] = np.nan
+    return idx
+
+
+def month_index_to_datetime(idx) -> np.ndarray:
+
+    # Integer month arithmetic, no string parsing
+    idx = np.asarray(idx, dtype="float64")
+    out = np.full(idx.shape, np.datetime64("NaT"), dtype="datetime64[M]")
+    ok = ~np.isnan(idx)
+    out[ok] = (idx[ok].astype(np.int64) - _EPOCH_MONTH).astype("datetime64[M]")
+    return out.astype("datetime64[ns]")
+
+
+def datetime_to_month_index(values) -> np.ndarray:
+
+    # datetime -> year * 12 + (month - 1) as float, NaN for NaT
+    v = np.asarray(values)
+    if v.dtype.kind != "M":
+        v = np.asarray(pd.to_datetime(values), dtype="datetime64[ns]")
+    v = v.astype("datetime64[M]")
+    idx = v.astype(np.int64).astype("float64") + _EPOCH_MONTH
+    idx[np.isnat(v)] = np.nan
+    return idx
+
+
+def loan_id_vintage(ids) -> np.ndarray:
+
+    # Origination year from the loan ID (F99Q1... -> 1999, F10Q1... -> 2010) as float, NaN when
+    # missing; two-digit years from 90 on are 19xx. Parsed once per distinct ID.
+    codes, uniques = pd.factorize(pd.Series(ids, copy=False))
+    yy = pd.to_numeric(pd.Index(uniques).astype(str).str[1:3], errors="coerce").to_numpy(dtype="float64")
+    years = yy + np.where(yy >= 90, 1900, 2000)
+    return np.append(years, np.nan)[codes]
+
+
+def _to_datetime_yyyymm(s: pd.Series) -> pd.Series:
+
+    if is_datetime64_any_dtype(s):
+        return s.astype("datetime64[ns]")
+    return pd.Series(month_index_to_datetime(yyyymm_to_month_index(s)), index=s.index, name=s.name)
+
+
+def _to_numeric(s: pd.Series) -> pd.Series:
+
+    return s if is_numeric_dtype(s) else pd.to_numeric(s, errors="coerce")
+
+
+def _flag_to_int(s: pd.Series) -> pd.Series:
+
+    # 'Y' = 1, 'N' = 0, anything else missing; mapped once per category, then gathered by code
+    if is_numeric_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype("Int64")
+
+    cat = s.astype("category")
+    lookup = cat.cat.categories.astype(str).str.strip().map({"N": 0, "Y": 1}).to_numpy(dtype="float64")
+    lookup = np.append(lookup, np.nan)                      # code -1 -> missing
+    values = lookup[cat.cat.codes.to_numpy()]
+    mask = np.isnan(values)
+    return pd.Series(pd.arrays.IntegerArray(np.where(mask, 0, values).astype(np.int64), mask),
+                     index=s.index, name=s.name)
+
+
+def _to_category(s: pd.Series, fill: str) -> pd.Series:
+
+    # Blank/missing -> fill; labels are the str() of each value, as before, but built per category
+    cat = s.astype("category")
+    labels = cat.cat.categories.astype(str).tolist()
+    blank = [lab.strip() == "" for lab in labels]
+
+    new_cats, inverse = np.unique(labels + [fill], return_inverse=True)
+    fill_code = inverse[-1]
+    remap = np.where(blank, fill_code, inverse[:-1])
+    remap = np.append(remap, fill_code).astype(np.int32)    # code -1 -> fill
+
+    codes = remap[cat.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=new_cats.tolist()),
+                     index=s.index, name=s.name)
+
+
+def format_orig(orig):
 
     # origination format
     orig["LoanSequenceNumber"] = orig["LoanSequenceNumber"].astype(str)
-    orig["MaturityDate"] = pd.to_datetime(orig["MaturityDate"], format="%Y%m", errors="coerce")
+    orig["MaturityDate"] = _to_datetime_yyyymm(orig["MaturityDate"])
+
+    orig["PPM_Flag"] = _flag_to_int(orig["PPM_Flag"])
+
+    orig["PropertyState"] = orig["PropertyState"].astype(str)
+    orig["PropertyType"] = orig["PropertyType"].astype(str).replace({"99": None})
 
-    orig["PPM_Flag"] = (orig["PPM_Flag"].astype(str).str.strip().replace({"Y": 1, "N": 0, "": np.nan}).astype("Int64"))
-    orig["PPM_Flag"] = pd.to_numeric(orig["PPM_Flag"], errors="coerce").astype("Int64")
+    # InterestOnlyFlag: 'Y' = 1, 'N' = 0
+    orig["InterestOnlyFlag"] = _flag_to_int(orig["InterestOnlyFlag"])
 
-    orig["PropertyState"]=orig["PropertyState"].astype(str)
+    orig["UPB"] = _to_numeric(orig["UPB"])
 
-    orig["PropertyType"]=orig["PropertyType"].astype(str)
-    orig["PropertyType"].replace({"99": None}, inplace=True)
+    return orig
 
-# InterestOnlyFlag: 'Y' = 1, 'N' = 0
-    orig["InterestOnlyFlag"] = (orig["InterestOnlyFlag"].astype(str).str.strip().replace({"Y": 1, "N": 0, "": np.nan}).astype("Int64"))
-    orig["InterestOnlyFlag"] = pd.to_numeric(orig["InterestOnlyFlag"], errors="coerce").astype("Int64")
 
-    orig["UPB"] = pd.to_numeric(orig["UPB"], errors="coerce")
+def format_perf(perf):
 
-    # performance formt
+    # performance format
     perf["LoanSequenceNumber"] = perf["LoanSequenceNumber"].astype(str)
-    perf["LoanAge"]=pd.to_numeric(perf["LoanAge"], errors="coerce")
-    perf["MonthlyReportingPeriod"] = pd.to_datetime(perf["MonthlyReportingPeriod"], format="%Y%m", errors="coerce")
-    perf["CurrentActualUPB"] = pd.to_numeric(perf["CurrentActualUPB"], errors="coerce")
-    perf["CurrentInterestRate"] = pd.to_numeric(perf["CurrentInterestRate"], errors="coerce")
-    perf["EstimatedLTV"] = pd.to_numeric(perf["EstimatedLTV"], errors="coerce")
-    perf["EstimatedLTV"] = perf["EstimatedLTV"].replace({999: np.nan})
-    perf["ZeroBalanceEffectiveDate"] = pd.to_datetime(perf["ZeroBalanceEffectiveDate"],format="%Y%m",errors="coerce")
-
-    # categorical var 
+    perf["LoanAge"] = _to_numeric(perf["LoanAge"])
+    perf["MonthlyReportingPeriod"] = _to_datetime_yyyymm(perf["MonthlyReportingPeriod"])
+    perf["CurrentActualUPB"] = _to_numeric(perf["CurrentActualUPB"])
+    perf["CurrentInterestRate"] = _to_numeric(perf["CurrentInterestRate"])
+    perf["EstimatedLTV"] = _to_numeric(perf["EstimatedLTV"])
+    perf["EstimatedLTV"] = perf["EstimatedLTV"].where(perf["EstimatedLTV"] != 999)
+    perf["ZeroBalanceEffectiveDate"] = _to_datetime_yyyymm(perf["ZeroBalanceEffectiveDate"])
+
+    # categorical var
     # ZeroBalanceCode: blank = no event occurs
-    perf["ZeroBalanceCode"] = (
-    perf["ZeroBalanceCode"]
-    .replace(" ", np.nan)
-    .fillna("not_applicable")   
-    .astype(str)                
-)                               
-    perf["ZeroBalanceCode"] = perf["ZeroBalanceCode"].astype("category")
-
-# ModificationFlag: blank = not modified
-    perf["ModificationFlag"] = (
-    perf["ModificationFlag"]
-    .replace(" ", np.nan)
-    .fillna("not_modified")
-    .astype(str)
-)
-    perf["ModificationFlag"] = perf["ModificationFlag"].astype("category")
-
-
-    return orig, perf
+    perf["ZeroBalanceCode"] = _to_category(perf["ZeroBalanceCode"], "not_applicable")
+
+    # ModificationFlag: blank = not modified
+    perf["ModificationFlag"] = _to_category(perf["ModificationFlag"], "not_modified")
+
+    return perf
+
+
+def format_datasets(orig, perf):
+
+    return format_orig(orig), format_perf(perf)
+
+
+def benchmark_format_perf(
+    n_rows: int = 50_000_000,
+    *,
+    n_loans: int = 500_000,
+    seed: int = 0,
+    output_dir: str = "Outputs/reports/benchmarks",
+    filename: str = "format_benchmark.csv",
+) -> pd.DataFrame:
+
+    rng = np.random.default_rng(seed)
+
+    # Synthetic raw servicing columns, as read_csv returns them
+    periods = (2010 + rng.integers(0, 15, n_rows)) * 100 + rng.integers(1, 13, n_rows)
+    zb_dates = np.where(rng.random(n_rows) < 0.01, periods, np.nan)
+    ids = pd.Categorical.from_codes(rng.integers(0, n_loans, n_rows),
+                                    categories=[f"F10Q1{i:07d}" for i in range(n_loans)])
+    raw = pd.DataFrame({
+        "LoanSequenceNumber": ids,
+        "CurrentActualUPB": rng.uniform(0, 500_000, n_rows),
+        "MonthlyReportingPeriod": periods,
+        "ZeroBalanceCode": np.where(np.isnan(zb_dates), np.nan, 1.0),
+        "ZeroBalanceEffectiveDate": zb_dates,
+        "CurrentInterestRate": rng.uniform(2, 7, n_rows),
+        "EstimatedLTV": rng.integers(20, 120, n_rows).astype("float64"),
+        "ModificationFlag": np.where(rng.random(n_rows) < 0.02, "Y", None),
+        "LoanAge": rng.integers(0, 360, n_rows),
+    })
+
+    rows = []
+
+    # Date conversion alone: string parsing vs integer month arithmetic
+    sample = raw["MonthlyReportingPeriod"]
+    t0 = time.perf_counter()
+    pd.to_datetime(sample.astype(str), format="%Y%m", errors="coerce")
+    rows.append({"step": "MonthlyReportingPeriod via to_datetime(format='%Y%m')", "seconds": time.perf_counter() - t0})
+
+    t0 = time.perf_counter()
+    _to_datetime_yyyymm(sample)
+    rows.append({"step": "MonthlyReportingPeriod via integer months", "seconds": time.perf_counter() - t0})
+
+    # Full servicing format
+    t0 = time.perf_counter()
+    format_perf(raw)
+    rows.append({"step": "format_perf (all columns)", "seconds": time.perf_counter() - t0})
+
+    report = pd.DataFrame(rows)
+    report["rows"] = n_rows
+    report["rows_per_second"] = n_rows / report["seconds"]
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
+    return report
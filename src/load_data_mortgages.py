@@ -1,9 +1,103 @@
-
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
 from pathlib import Path
-from src.format_variables_mortgages import format_datasets
+from src.format_variables_mortgages import format_datasets, FORMAT_VERSION
+from src.cache import file_fingerprint, cache_key, read_manifest, write_manifest
+
+
+# Define column names
+ORIG_COLS = [
+    "CreditScore","FirstPaymentDate","FirstTimeHomebuyerFlag","MaturityDate",
+    "MSA","MI_Percent","NumberOfUnits","OccupancyStatus","CLTV","DTI",
+    "UPB","LTV","InterestRate","Channel","PPM_Flag","AmortizationType",
+    "PropertyState","PropertyType","PostalCode","LoanSequenceNumber",
+    "LoanPurpose","LoanTerm","NumBorrowers","SellerName","ServicerName",
+    "SuperConformingFlag","PreHARP_SequenceNumber","ProgramIndicator",
+    "HARP_Indicator","PropertyValuationMethod","InterestOnlyFlag",
+    "MICancelIndicator"
+]
+
+PERF_COLS = [
+    "LoanSequenceNumber","MonthlyReportingPeriod","CurrentActualUPB",
+    "CurrentLoanDelinquencyStatus","LoanAge","MonthsToMaturity","DefectSettlementDate",
+    "ModificationFlag","ZeroBalanceCode","ZeroBalanceEffectiveDate",
+    "CurrentInterestRate","CurrentDeferredUPB","DDLPI","MIRecoveries",
+    "NetSalesProceeds","NonMIRecoveries","Expenses","LegalCosts",
+    "MaintenanceCosts","TaxesInsurance","MiscExpenses","ActualLossCalculation",
+    "ModificationCost","StepModificationFlag","DeferredPaymentPlan",
+    "EstimatedLTV","ZeroBalanceRemovalUPB","DelinquentAccruedInterest",
+    "DelinquencyDueToDisaster","BorrowerAssistanceStatusCode",
+    "CurrentMonthModificationCost","InterestBearingUPB"
+]
+
+# Relevant variables
+ORIG_SELECT = ["LoanSequenceNumber", "PPM_Flag", "MaturityDate", "InterestOnlyFlag", "UPB", "PropertyState","PropertyType"]
+PERF_SELECT = ["LoanSequenceNumber", "CurrentActualUPB", "MonthlyReportingPeriod",
+    "ZeroBalanceCode", "ZeroBalanceEffectiveDate", "CurrentInterestRate",
+    "EstimatedLTV", "ModificationFlag", "LoanAge"]
+
+# Arrow types applied while parsing: IDs and flags dictionary-encoded, YYYYMM as dates, rest numeric
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+ORIG_ARROW_TYPES = {
+    "LoanSequenceNumber": _DICT,
+    "PPM_Flag": _DICT,
+    "MaturityDate": pa.timestamp("ns"),
+    "InterestOnlyFlag": _DICT,
+    "UPB": pa.int64(),
+    "PropertyState": _DICT,
+    "PropertyType": _DICT,
+}
+
+PERF_ARROW_TYPES = {
+    "LoanSequenceNumber": _DICT,
+    "CurrentActualUPB": pa.float64(),
+    "MonthlyReportingPeriod": pa.timestamp("ns"),
+    "ZeroBalanceCode": pa.float64(),
+    "ZeroBalanceEffectiveDate": pa.timestamp("ns"),
+    "CurrentInterestRate": pa.float64(),
+    "EstimatedLTV": pa.float64(),
+    "ModificationFlag": _DICT,
+    "LoanAge": pa.int64(),
+}
+
+_LAYOUTS = {
+    "orig": (ORIG_COLS, ORIG_SELECT, ORIG_ARROW_TYPES),
+    "perf": (PERF_COLS, PERF_SELECT, PERF_ARROW_TYPES),
+}
 
-def load_freddie_mac_data(input_dir, output_dir="Outputs"):
+
+def read_freddie_mac_file(path, kind: str, engine: str = "arrow") -> pd.DataFrame:
+
+    if kind not in _LAYOUTS:
+        raise ValueError(f"kind must be one of {list(_LAYOUTS)}, got '{kind}'.")
+    cols, select, arrow_types = _LAYOUTS[kind]
+
+    if engine == "pandas":
+        df = pd.read_csv(path, sep="|", header=None, names=cols, low_memory=False)
+        return df[select]
+
+    if engine != "arrow":
+        raise ValueError(f"engine must be 'arrow' or 'pandas', got '{engine}'.")
+
+    # Only the projected columns are converted, the others are skipped by the tokenizer
+    table = pv.read_csv(
+        path,
+        read_options=pv.ReadOptions(column_names=cols),
+        parse_options=pv.ParseOptions(delimiter="|"),
+        convert_options=pv.ConvertOptions(
+            include_columns=select,
+            column_types=arrow_types,
+            timestamp_parsers=["%Y%m"],
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas()
+
+
+def load_freddie_mac_data(input_dir, output_dir="Outputs", engine="arrow", use_cache=True):
     input_dir = Path(input_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
@@ -11,51 +105,34 @@ def load_freddie_mac_data(input_dir, output_dir="Outputs"):
     # Parquet file paths
     orig_parquet = output_dir / "orig_formatted.parquet"
     perf_parquet = output_dir / "perf_formatted.parquet"
+    manifest_path = output_dir / "formatted_manifest.json"
 
-    '''
-    #If formatted Parquet files exist, load them directly
-    if orig_parquet.exists() and perf_parquet.exists():
-        orig = pd.read_parquet(orig_parquet)
-        perf = pd.read_parquet(perf_parquet)
-        return orig, perf
-    '''
     #read the raw text files
     orig_file = input_dir / "sample_orig_2010.txt"
     perf_file = input_dir / "sample_svcg_2010.txt"
 
-    # Define column names 
-    orig_cols = [
-        "CreditScore","FirstPaymentDate","FirstTimeHomebuyerFlag","MaturityDate",
-        "MSA","MI_Percent","NumberOfUnits","OccupancyStatus","CLTV","DTI",
-        "UPB","LTV","InterestRate","Channel","PPM_Flag","AmortizationType",
-        "PropertyState","PropertyType","PostalCode","LoanSequenceNumber",
-        "LoanPurpose","LoanTerm","NumBorrowers","SellerName","ServicerName",
-        "SuperConformingFlag","PreHARP_SequenceNumber","ProgramIndicator",
-        "HARP_Indicator","PropertyValuationMethod","InterestOnlyFlag",
-        "MICancelIndicator"
-    ]
-
-    perf_cols = [
-        "LoanSequenceNumber","MonthlyReportingPeriod","CurrentActualUPB",
-        "CurrentLoanDelinquencyStatus","LoanAge","MonthsToMaturity","DefectSettlementDate",
-        "ModificationFlag","ZeroBalanceCode","ZeroBalanceEffectiveDate",
-        "CurrentInterestRate","CurrentDeferredUPB","DDLPI","MIRecoveries",
-        "NetSalesProceeds","NonMIRecoveries","Expenses","LegalCosts",
-        "MaintenanceCosts","TaxesInsurance","MiscExpenses","ActualLossCalculation",
-        "ModificationCost","StepModificationFlag","DeferredPaymentPlan",
-        "EstimatedLTV","ZeroBalanceRemovalUPB","DelinquentAccruedInterest",
-        "DelinquencyDueToDisaster","BorrowerAssistanceStatusCode",
-        "CurrentMonthModificationCost","InterestBearingUPB"
-    ]
-
-    orig = pd.read_csv(orig_file, sep="|", header=None, names=orig_cols, low_memory=False)
-    perf = pd.read_csv(perf_file, sep="|", header=None, names=perf_cols, low_memory=False)
-
-    # Select relevant variables
-    orig = orig[["LoanSequenceNumber", "PPM_Flag", "MaturityDate", "InterestOnlyFlag", "UPB", "PropertyState","PropertyType"]]
-    perf = perf[["LoanSequenceNumber", "CurrentActualUPB", "MonthlyReportingPeriod",
-        "ZeroBalanceCode", "ZeroBalanceEffectiveDate", "CurrentInterestRate",
-        "EstimatedLTV", "ModificationFlag", "LoanAge"]]
+    # Cache key: raw inputs, selected variables and formatting version
+    key = cache_key(
+        orig=file_fingerprint(orig_file),
+        perf=file_fingerprint(perf_file),
+        orig_select=ORIG_SELECT,
+        perf_select=PERF_SELECT,
+        format_version=FORMAT_VERSION,
+    )
+
+    #If formatted Parquet files exist for the same key, load them directly
+    if (
+        use_cache
+        and read_manifest(manifest_path).get("key") == key
+        and orig_parquet.exists() and perf_parquet.exists()
+    ):
+        orig = pd.read_parquet(orig_parquet)
+        perf = pd.read_parquet(perf_parquet)
+        return orig, perf
+
+    # Read only the relevant variables
+    orig = read_freddie_mac_file(orig_file, "orig", engine=engine)
+    perf = read_freddie_mac_file(perf_file, "perf", engine=engine)
 
     # Format variables (types, categories, dates)
     orig, perf = format_datasets(orig, perf)
@@ -63,5 +140,49 @@ def load_freddie_mac_data(input_dir, output_dir="Outputs"):
     # Save formatted data as Parquet
     orig.to_parquet(orig_parquet, index=False)
     perf.to_parquet(perf_parquet, index=False)
+    write_manifest(manifest_path, key, orig_file=orig_file, perf_file=perf_file,
+                   format_version=FORMAT_VERSION)
 
     return orig, perf
+
+
+def benchmark_loaders(
+    input_dir,
+    *,
+    repeat: int = 3,
+    orig_name: str = "sample_orig_2010.txt",
+    perf_name: str = "sample_svcg_2010.txt",
+    output_dir: str = "Outputs/reports/benchmarks",
+    filename: str = "loader_benchmark.csv",
+) -> pd.DataFrame:
+
+    input_dir = Path(input_dir)
+    rows = []
+
+    for engine in ("pandas", "arrow"):
+        for kind, name in (("orig", orig_name), ("perf", perf_name)):
+            timings = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                df = read_freddie_mac_file(input_dir / name, kind, engine=engine)
+                timings.append(time.perf_counter() - t0)
+
+            rows.append({
+                "engine": engine,
+                "file": name,
+                "rows": len(df),
+                "best_seconds": min(timings),
+                "mean_seconds": sum(timings) / len(timings),
+                "result_MB": df.memory_usage(deep=True).sum() / 1e6,
+            })
+
+    report = pd.DataFrame(rows)
+    base = report[report["engine"] == "pandas"].set_index("file")["best_seconds"]
+    report["speedup_vs_pandas"] = base.reindex(report["file"]).to_numpy() / report["best_seconds"]
+
+    # Save report
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    report.to_csv(output_path / filename, index=False)
+
+    return report
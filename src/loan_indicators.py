@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from src.loan_panel import LoanPanel
+
+
+# Loan-level indicators as grouped reductions over a LoanPanel: one array pass per indicator
+# instead of a Python call per loan. Arguments are column names or arrays in panel order;
+# results have length lp.n_loans and are aligned with lp.ids.
+
+
+def _values(lp: LoanPanel, values) -> np.ndarray:
+    return lp.column(values) if isinstance(values, str) else np.asarray(values)
+
+
+def changes(lp: LoanPanel, values) -> np.ndarray:
+
+    # Row mask: the value differs from the previous row of the same loan (never on a loan's
+    # first row, nor when the previous value is missing)
+    v = _values(lp, values)
+    prev = lp.shift(v)
+    return ~pd.isna(prev) & (v != prev)
+
+
+def is_flagged(lp: LoanPanel, values, flag="Y") -> np.ndarray:
+    return lp.any(_values(lp, values) == flag)
+
+
+def any_change(lp: LoanPanel, values) -> np.ndarray:
+    return lp.any(changes(lp, values))
+
+
+def n_changes(lp: LoanPanel, values) -> np.ndarray:
+    return lp.sum(changes(lp, values)).astype(np.int64)
+
+
+def first_change_period(lp: LoanPanel, values, periods=None) -> np.ndarray:
+
+    # Period (default: the panel's month index) of each loan's first change, NaN without one
+    periods = lp.months if periods is None else _values(lp, periods)
+    if periods is None:
+        raise ValueError("first_change_period needs `periods` when the panel has no date column.")
+    rows = np.flatnonzero(changes(lp, values))
+    rows = rows[lp.codes[rows] < lp.n_loans]
+    out = np.full(lp.n_loans, np.nan)
+    loans, first = np.unique(lp.codes[rows], return_index=True)
+    out[loans] = np.asarray(periods, dtype="float64")[rows[first]]
+    return out
+
+
+def rate_modification_indicators(lp: LoanPanel, rate_col: str, mod_col: str, flag="Y") -> pd.DataFrame:
+
+    # Per loan: whether / how often the rate changed, and whether the loan was ever modified
+    changed = changes(lp, lp.column(rate_col, dtype="float64"))
+    return pd.DataFrame({
+        "rate_changed": lp.any(changed),
+        "n_rate_changes": lp.sum(changed).astype(np.int64),
+        "modified": is_flagged(lp, mod_col, flag),
+    }, index=lp.ids)
@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+from src.format_variables_mortgages import datetime_to_month_index
+
+
+# (loan, month) packed into one int64: loan code in the high bits, month index (< 2**20) in the low bits
+MONTH_BITS = 20
+_NO_MONTH = (1 << MONTH_BITS) - 1
+
+
+def loan_month_key(codes: np.ndarray, months: np.ndarray) -> np.ndarray:
+
+    # Missing months sort last within their loan
+    m = np.where(np.isnan(months), _NO_MONTH, months).astype(np.int64)
+    return (codes.astype(np.int64) << MONTH_BITS) | m
+
+
+def sort_order(key: np.ndarray) -> np.ndarray | None:
+
+    # None when already sorted, so the common pre-sorted panel is never reordered
+    if key.size < 2 or (key[1:] >= key[:-1]).all():
+        return None
+    return np.argsort(key, kind="stable")
+
+
+def _missing(dtype):
+
+    # Missing-value marker matching the dtype: NaT for dates, None for objects, NaN otherwise
+    if dtype.kind in "mM":
+        return np.array("NaT", dtype=dtype)[()]
+    return None if dtype == object else np.nan
+
+
+def _fill_dtype(dtype, fill):
+    return dtype if dtype == object else np.result_type(dtype, np.asarray(fill).dtype)
+
+
+class LoanPanel:
+
+    # Loan-month rows sorted once by (loan, month) and stored CSR-style: the rows of loan i
+    # are offsets[i]:offsets[i + 1]. Per-loan shift/diff/first/last/any/cumulative operations
+    # are single array passes over those segments instead of a groupby (and a sort) each.
+    # With date_col=None rows are grouped by loan only, keeping their input order within a loan.
+    # Rows with a missing loan ID form a trailing segment that is left out of every per-loan
+    # operation (shifts give `fill`, reductions ignore them), like groupby's dropna.
+    #
+    # Array arguments and results are in panel (sorted) order; use column() to bring an input
+    # column into that order and to_input_order() to go back.
+
+    def __init__(self, df: pd.DataFrame, id_col: str = "LoanSequenceNumber",
+                 date_col: str | None = "MonthlyReportingPeriod"):
+
+        self.df = df
+        self.id_col, self.date_col = id_col, date_col
+
+        codes, ids = pd.factorize(df[id_col], sort=True)
+        codes = np.where(codes < 0, len(ids), codes)
+
+        if date_col is None:
+            months = None
+            key = codes.astype(np.int64)
+        else:
+            months = datetime_to_month_index(df[date_col])
+            key = loan_month_key(codes, months)
+
+        order = sort_order(key)
+        if order is not None:
+            codes, key = codes[order], key[order]
+            months = None if months is None else months[order]
+
+        self.order = order
+        self.ids = pd.Index(ids, name=id_col)
+        self.codes = codes
+        self.months = months
+        self.key = key
+
+        # offsets[-1] is where the rows with a missing ID start (len(df) when there are none)
+        self.offsets = np.searchsorted(codes, np.arange(len(ids) + 1), side="left")
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __repr__(self) -> str:
+        return f"LoanPanel(rows={len(self)}, loans={self.n_loans}, sorted_input={self.order is None})"
+
+    @property
+    def n_loans(self) -> int:
+        return len(self.ids)
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.offsets[:-1]
+
+    @property
+    def is_first(self) -> np.ndarray:
+        out = np.zeros(len(self), dtype=bool)
+        out[self.starts] = True
+        return out
+
+    @property
+    def is_last(self) -> np.ndarray:
+        out = np.zeros(len(self), dtype=bool)
+        out[self.offsets[1:] - 1] = True
+        out[self.offsets[-1]:] = False
+        return out
+
+    # --- moving data in and out of panel order ---
+
+    def column(self, name: str, dtype=None) -> np.ndarray:
+        values = self.df[name].to_numpy(dtype=dtype)
+        return values if self.order is None else values[self.order]
+
+    def frame(self, columns=None) -> pd.DataFrame:
+        df = self.df if columns is None else self.df[list(columns)]
+        return df if self.order is None else df.take(self.order)
+
+    def to_input_order(self, values) -> np.ndarray:
+        values = np.asarray(values)
+        if self.order is None:
+            return values
+        out = np.empty_like(values)
+        out[self.order] = values
+        return out
+
+    def codes_of(self, ids) -> np.ndarray:
+
+        # Loan codes of IDs from another table (e.g. origination); n_loans, the code of rows
+        # with a missing ID, for IDs that are missing or not in the panel
+        codes = self.ids.get_indexer(np.asarray(ids))
+        return np.where(codes < 0, self.n_loans, codes)
+
+    def broadcast(self, per_loan, fill=None) -> np.ndarray:
+
+        # Per-loan values repeated to every row of the loan
+        per_loan = np.asarray(per_loan)
+        if self.offsets[-1] == len(self):
+            return per_loan[self.codes]
+        fill = _missing(per_loan.dtype) if fill is None else fill
+        ext = np.empty(len(per_loan) + 1, dtype=_fill_dtype(per_loan.dtype, fill))
+        ext[:-1], ext[-1] = per_loan, fill
+        return ext[self.codes]
+
+    def _values(self, values) -> np.ndarray:
+        return self.column(values) if isinstance(values, str) else np.asarray(values)
+
+    # --- row-level primitives ---
+
+    def shift(self, values, periods: int = 1, fill=None) -> np.ndarray:
+
+        # Value `periods` rows earlier (later if negative) within the same loan; `fill`
+        # (default: the dtype's missing value) where there is no such row
+        v = self._values(values)
+        n = len(v)
+        fill = _missing(v.dtype) if fill is None else fill
+        dtype = _fill_dtype(v.dtype, fill)
+        out = np.full(n, fill, dtype=dtype)
+        k = abs(periods)
+        if k == 0:
+            return v.astype(dtype, copy=True)
+        if k >= n:
+            return out
+
+        same = self.codes[k:] == self.codes[:-k]
+        same &= self.codes[k:] < self.n_loans
+        if periods > 0:
+            out[k:][same] = v[:-k][same]
+        else:
+            out[:-k][same] = v[k:][same]
+        return out
+
+    def diff(self, values, periods: int = 1) -> np.ndarray:
+        v = self._values(values).astype("float64")
+        return v - self.shift(v, periods)
+
+    def cumsum(self, values) -> np.ndarray:
+
+        # Running total within each loan (NaN propagates, unlike groupby.cumsum)
+        v = self._values(values).astype("float64")
+        end = self.offsets[-1]
+        total = np.cumsum(v[:end])
+        before = np.concatenate([[0.0], total])[self.starts]
+        out = np.full(len(v), np.nan)
+        out[:end] = total - np.repeat(before, np.diff(self.offsets))
+        return out
+
+    def cumcount(self) -> np.ndarray:
+
+        # Position of each row within its loan (0 for the first row)
+        end = self.offsets[-1]
+        out = np.full(len(self), -1, dtype=np.int64)
+        out[:end] = np.arange(end) - np.repeat(self.starts, np.diff(self.offsets))
+        return out
+
+    # --- per-loan reductions (arrays of length n_loans, aligned with self.ids) ---
+
+    def _reduce(self, ufunc, v: np.ndarray) -> np.ndarray:
+        if self.n_loans == 0:
+            return np.asarray([], dtype=v.dtype)
+        return ufunc.reduceat(v[:self.offsets[-1]], self.starts)
+
+    def first(self, values, skipna: bool = False) -> np.ndarray:
+        return self._nth(self._values(values), skipna, last=False)
+
+    def last(self, values, skipna: bool = False) -> np.ndarray:
+        return self._nth(self._values(values), skipna, last=True)
+
+    def _nth(self, v: np.ndarray, skipna: bool, last: bool) -> np.ndarray:
+
+        if not skipna:
+            return v[self.offsets[1:] - 1] if last else v[self.starts]
+
+        # First / last non-missing row of each loan, missing when the loan has none
+        valid = ~pd.isna(v)
+        pos = np.arange(len(v))
+        if last:
+            idx = self._reduce(np.maximum, np.where(valid, pos, -1))
+            found = idx >= self.starts
+        else:
+            idx = self._reduce(np.minimum, np.where(valid, pos, len(v)))
+            found = idx < self.offsets[1:]
+        out = v[np.where(found, idx, 0)] if len(v) else v[:0]
+        if not found.all():
+            fill = _missing(v.dtype)
+            out = out.astype(_fill_dtype(v.dtype, fill))
+            out[~found] = fill
+        return out
+
+    def any(self, mask) -> np.ndarray:
+        return self._reduce(np.logical_or, self._values(mask).astype(bool))
+
+    def all(self, mask) -> np.ndarray:
+        return self._reduce(np.logical_and, self._values(mask).astype(bool))
+
+    def sum(self, values) -> np.ndarray:
+        return self._reduce(np.add, np.nan_to_num(self._values(values).astype("float64")))
+
+    def count(self) -> np.ndarray:
+        return np.diff(self.offsets)
@@ -0,0 +1,181 @@
+import json
+import pandas as pd
+from pathlib import Path
+
+
+MANIFEST = "_panel.json"
+
+
+class PanelStore:
+
+    # Loan-month panel kept as a directory of row-aligned Parquet column groups.
+    # Every part holds the same rows in the same order; adding columns writes a new
+    # part, appending rows writes one new segment file per part. Existing files are
+    # never rewritten.
+
+    def __init__(self, path):
+        self.path = Path(path)
+        manifest_path = self.path / MANIFEST
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No panel store found at '{self.path}' (missing {MANIFEST}).")
+        self._manifest = json.loads(manifest_path.read_text())
+
+    @classmethod
+    def write(cls, df: pd.DataFrame, path, *, overwrite: bool = True) -> "PanelStore":
+
+        path = Path(path)
+        if (path / MANIFEST).exists():
+            if not overwrite:
+                raise FileExistsError(f"Panel store already exists at '{path}'.")
+            old = json.loads((path / MANIFEST).read_text())
+            for part in old["parts"]:
+                for f in old.get("segments", {}).get(part, [part]):
+                    (path / f).unlink(missing_ok=True)
+        elif path.exists() and any(path.iterdir()):
+            raise FileExistsError(f"'{path}' is not empty and is not a panel store.")
+
+        path.mkdir(parents=True, exist_ok=True)
+        part = "part-0000.parquet"
+        df.to_parquet(path / part, index=False)
+
+        manifest = {
+            "n_rows": len(df),
+            "next_part": 1,
+            "parts": {part: list(df.columns)},
+            "segments": {part: [part]},
+            "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+        }
+        cls._save_manifest(path, manifest)
+        return cls(path)
+
+    @staticmethod
+    def _save_manifest(path: Path, manifest: dict) -> None:
+
+        tmp = path / (MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2))
+        tmp.replace(path / MANIFEST)
+
+    @property
+    def columns(self) -> list[str]:
+        return [c for cols in self._manifest["parts"].values() for c in cols]
+
+    @property
+    def dtypes(self) -> dict:
+        return dict(self._manifest["dtypes"])
+
+    def _segments(self, part: str) -> list[str]:
+        return self._manifest.setdefault("segments", {}).setdefault(part, [part])
+
+    def __len__(self) -> int:
+        return self._manifest["n_rows"]
+
+    def __repr__(self) -> str:
+        return f"PanelStore('{self.path}', rows={len(self)}, columns={len(self.columns)})"
+
+    def read(self, columns=None) -> pd.DataFrame:
+
+        wanted = self.columns if columns is None else list(columns)
+        missing = [c for c in wanted if c not in self.columns]
+        if missing:
+            raise KeyError(f"Columns not in panel store: {missing}")
+
+        # Only the part files holding the requested columns are opened
+        frames = []
+        for part, cols in self._manifest["parts"].items():
+            take = [c for c in cols if c in wanted]
+            if take:
+                segments = [pd.read_parquet(self.path / f, columns=take) for f in self._segments(part)]
+                frames.append(pd.concat(segments, ignore_index=True) if len(segments) > 1 else segments[0])
+
+        df = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+
+        # Appended segments may carry different category sets
+        for c in wanted:
+            if self.dtypes.get(c) == "category" and not isinstance(df[c].dtype, pd.CategoricalDtype):
+                df[c] = df[c].astype("category")
+        return df[wanted]
+
+    def add_columns(self, new: pd.DataFrame, *, on=None) -> "PanelStore":
+
+        # on=None: `new` is already in panel row order; otherwise align on the key columns
+        if on is not None:
+            on = [on] if isinstance(on, str) else list(on)
+            keys = self.read(on)
+            new = keys.merge(new, on=on, how="left", validate="many_to_one").drop(columns=on)
+
+        if len(new) != len(self):
+            raise ValueError(f"New columns have {len(new)} rows, panel store has {len(self)}.")
+
+        manifest = self._manifest
+        part = f"part-{manifest['next_part']:04d}.parquet"
+        new.reset_index(drop=True).to_parquet(self.path / part, index=False)
+
+        # Replaced columns are dropped from their old part; empty parts are removed
+        dead = []
+        for old_part, cols in list(manifest["parts"].items()):
+            manifest["parts"][old_part] = [c for c in cols if c not in new.columns]
+            if not manifest["parts"][old_part]:
+                del manifest["parts"][old_part]
+                dead.append(old_part)
+
+        dead_files = [f for old_part in dead for f in self._segments(old_part)]
+        for old_part in dead:
+            del manifest["segments"][old_part]
+
+        manifest["parts"][part] = list(new.columns)
+        manifest["segments"][part] = [part]
+        manifest["next_part"] += 1
+        manifest["dtypes"].update({c: str(t) for c, t in new.dtypes.items()})
+        self._save_manifest(self.path, manifest)
+
+        for f in dead_files:
+            (self.path / f).unlink(missing_ok=True)
+
+        return self
+
+    def append_rows(self, new: pd.DataFrame) -> "PanelStore":
+
+        # Columns missing from `new` are stored as NA, extra columns are ignored. Every column
+        # is cast to its stored dtype (bool becomes nullable when it has to hold NA), so the
+        # segments concatenate back to the dtypes of the panel
+        absent = set(self.columns).difference(new.columns)
+        new = new.reindex(columns=self.columns).reset_index(drop=True)
+        if new.empty:
+            return self
+        dtypes = self.dtypes
+        new = new.astype({c: "boolean" if c in absent and dtypes[c] == "bool" else dtypes[c]
+                          for c in self.columns if c in dtypes})
+
+        manifest = self._manifest
+        seg_id = manifest["next_part"]
+        for part, cols in manifest["parts"].items():
+            seg = f"{Path(part).stem}.seg-{seg_id:04d}.parquet"
+            new[cols].to_parquet(self.path / seg, index=False)
+            self._segments(part).append(seg)
+
+        manifest["n_rows"] += len(new)
+        manifest["next_part"] += 1
+        self._save_manifest(self.path, manifest)
+
+        return self
+
+
+def open_panel(path) -> PanelStore:
+
+    return PanelStore(path)
+
+
+def load_panel(source, columns=None) -> pd.DataFrame:
+
+    # Accepts a DataFrame, a PanelStore, a store directory, a Parquet file or a (legacy) CSV path
+    if isinstance(source, pd.DataFrame):
+        return source if columns is None else source[list(columns)]
+    if isinstance(source, PanelStore):
+        return source.read(columns)
+
+    path = Path(source)
+    if (path / MANIFEST).exists():
+        return PanelStore(path).read(columns)
+    if path.suffix == ".parquet" or path.is_dir():
+        return pd.read_parquet(path, columns=None if columns is None else list(columns))
+    return pd.read_csv(path, usecols=None if columns is None else list(columns))
@@ -0,0 +1,141 @@
+import re
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from src.load_data_mortgages import read_freddie_mac_file
+from src.format_variables_mortgages import format_orig, format_perf
+
+
+# sample_orig_2010.txt / sample_svcg_2010.txt and historical_data_2010Q1.txt / historical_data_time_2010Q1.txt
+_FILE_PATTERNS = [
+    (re.compile(r"^sample_orig_(\d{4})\.txt$"), "orig"),
+    (re.compile(r"^sample_svcg_(\d{4})\.txt$"), "perf"),
+    (re.compile(r"^historical_data_time_(\d{4})(Q[1-4])?\.txt$"), "perf"),
+    (re.compile(r"^historical_data_(\d{4})(Q[1-4])?\.txt$"), "orig"),
+]
+
+# Stable schemas so that every vintage file lands in the same dataset
+_CAT = pa.dictionary(pa.int32(), pa.string())
+
+ORIG_LAKE_SCHEMA = pa.schema([
+    ("LoanSequenceNumber", pa.string()),
+    ("PPM_Flag", pa.int64()),
+    ("MaturityDate", pa.timestamp("ns")),
+    ("InterestOnlyFlag", pa.int64()),
+    ("UPB", pa.int64()),
+    ("PropertyState", pa.string()),
+    ("PropertyType", pa.string()),
+])
+
+PERF_LAKE_SCHEMA = pa.schema([
+    ("LoanSequenceNumber", pa.string()),
+    ("CurrentActualUPB", pa.float64()),
+    ("MonthlyReportingPeriod", pa.timestamp("ns")),
+    ("ZeroBalanceCode", _CAT),
+    ("ZeroBalanceEffectiveDate", pa.timestamp("ns")),
+    ("CurrentInterestRate", pa.float64()),
+    ("EstimatedLTV", pa.float64()),
+    ("ModificationFlag", _CAT),
+    ("LoanAge", pa.int64()),
+])
+
+PARTITIONING = {
+    "orig": ds.partitioning(pa.schema([("vintage", pa.int16())]), flavor="hive"),
+    "perf": ds.partitioning(pa.schema([("vintage", pa.int16()), ("reporting_year", pa.int16())]), flavor="hive"),
+}
+
+
+def discover_vintage_files(input_dir, vintages=None) -> pd.DataFrame:
+
+    rows = []
+    for path in sorted(Path(input_dir).iterdir()):
+        for pattern, kind in _FILE_PATTERNS:
+            match = pattern.match(path.name)
+            if match:
+                rows.append({"kind": kind, "vintage": int(match.group(1)), "path": path})
+                break
+
+    files = pd.DataFrame(rows, columns=["kind", "vintage", "path"])
+    if vintages is not None:
+        files = files[files["vintage"].isin(list(vintages))]
+
+    return files.sort_values(["vintage", "kind", "path"]).reset_index(drop=True)
+
+
+def _convert_file(kind: str, vintage: int, path, lake_dir, engine: str) -> dict:
+
+    t0 = time.perf_counter()
+    path = Path(path)
+
+    # Read and format one raw file
+    df = read_freddie_mac_file(path, kind, engine=engine)
+    if kind == "orig":
+        df = format_orig(df)
+        schema = ORIG_LAKE_SCHEMA
+    else:
+        df = format_perf(df)
+        schema = PERF_LAKE_SCHEMA
+
+    table = pa.Table.from_pandas(df, preserve_index=False).select(schema.names).cast(schema)
+
+    # Partition keys
+    table = table.append_column("vintage", pa.array([vintage] * len(table), pa.int16()))
+    if kind == "perf":
+        years = df["MonthlyReportingPeriod"].dt.year.astype("Int16")
+        table = table.append_column("reporting_year", pa.array(years, pa.int16()))
+
+    # One basename per source file, so workers never write to the same file
+    ds.write_dataset(
+        table,
+        Path(lake_dir) / kind,
+        format="parquet",
+        partitioning=PARTITIONING[kind],
+        basename_template=f"{path.stem}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    return {
+        "kind": kind,
+        "vintage": vintage,
+        "file": path.name,
+        "rows": table.num_rows,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def build_parquet_lake(
+    input_dir,
+    lake_dir="Outputs/lake",
+    *,
+    vintages=None,
+    max_workers=None,
+    engine: str = "arrow",
+) -> pd.DataFrame:
+
+    files = discover_vintage_files(input_dir, vintages)
+    if files.empty:
+        raise FileNotFoundError(f"No Freddie Mac origination/servicing files found in '{input_dir}'.")
+
+    lake_dir = Path(lake_dir)
+    lake_dir.mkdir(parents=True, exist_ok=True)
+
+    # One raw file per worker
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(_convert_file, row.kind, row.vintage, row.path, lake_dir, engine)
+            for row in files.itertuples(index=False)
+        ]
+        results = [f.result() for f in futures]
+
+    return pd.DataFrame(results)
+
+
+def open_lake(lake_dir="Outputs/lake", kind: str = "perf") -> ds.Dataset:
+
+    if kind not in PARTITIONING:
+        raise ValueError(f"kind must be one of {list(PARTITIONING)}, got '{kind}'.")
+
+    return ds.dataset(Path(lake_dir) / kind, format="parquet", partitioning=PARTITIONING[kind])